@@ -49,7 +49,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middlewares.ProfilingMiddleware',
+    'main.middlewares.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'main.middlewares.QueryBudgetMiddleware',
+    'main.middlewares.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,7 +67,7 @@ ROOT_URLCONF = 'bulletin_board.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'main.profiling.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,6 +86,41 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'bulletin_board.wsgi.application'
 
+# Бюджеты SQL-запросов по именам маршрутов
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_DUPLICATE_THRESHOLD = 3
+QUERY_BUDGETS = {
+    'main:index': 5,
+    'main:by_rubric': 6,
+    'main:search': 4,
+    'main:detail': 7,
+    'main:profile': 4,
+    'main:profile_ad_detail': 6,
+    'main:comments': 3,
+    'main:archived_comments': 2,
+    'main:api_rubrics': 1,
+    'main:api_rubric_ads': 2,
+    'main:api_ad_detail': 2,
+    'main:api_ad_comments': 2,
+}
+
+# Заголовок Server-Timing и журнал медленных запросов
+PROFILING_ENABLED = True
+# Доля запросов, выполняемых под cProfile
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+# Запросы дольше порога в миллисекундах попадают в журнал
+PROFILING_SLOW_THRESHOLD = 500
+PROFILING_KEEP_DAYS = 7
+
+# Метрики Prometheus; для нескольких процессов задаётся переменная окружения PROMETHEUS_MULTIPROC_DIR
+METRICS_ENABLED = True
+# Адреса, с которых метрики доступны без входа; по умолчанию только персоналу сайта.
+# За обратным прокси на том же сервере REMOTE_ADDR всех запросов равен 127.0.0.1,
+# поэтому адрес сборщика указывается, только если /metrics/ закрыт от внешних запросов в самом прокси
+METRICS_ALLOWED_IPS = []
+
 # SMTP settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -90,6 +129,13 @@ EMAIL_HOST_PASSWORD = 'asdf1gh2jkzxcvb4'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 
+# Очередь исходящих писем
+MAIL_QUEUE_BATCH_SIZE = 100
+MAIL_QUEUE_MAX_ATTEMPTS = 5
+MAIL_QUEUE_RETRY_DELAY = 60
+MAIL_QUEUE_LEASE = 5 * 60
+ACTIVATION_MAIL_BATCH_SIZE = 100
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
@@ -105,9 +151,61 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения добавляются под любыми именами, кроме default, например:
+# DATABASES['replica'] = dict(DATABASES['default'], HOST='127.0.0.2', TEST={'MIRROR': 'default'})
+# Проверка маршрутизации на двух настоящих подключениях к одной тестовой базе:
+# BB_TEST_REPLICA=1 python manage.py test main.tests.ReplicaDatabaseTestCase
+if os.environ.get('BB_TEST_REPLICA'):
+    DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['main.routers.PrimaryReplicaRouter']
+# Время в секундах, в течение которого пользователь читает с основной базы после записи
+REPLICA_STICKY_SECONDS = 15
+REPLICA_STICKY_COOKIE = 'bb_primary'
+# Пауза в секундах перед повторным подключением к недоступной реплике
+REPLICA_RETRY_SECONDS = 30
+
 SOCIAL_AUTH_POSTGRES_JSONBFIELD = True
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    }
+}
+
+# Сессии читаются из кэша, копия в базе данных переживает вытеснение и перезапуск кэша; сообщения хранятся в сессиях
+SESSION_ENGINE = 'main.sessions'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+
+RUBRIC_TREE_CACHE_TIMEOUT = 60 * 60
+# Фрагменты страниц кэшируются до смены версии объявления или рубрики
+FRAGMENT_CACHE_TIMEOUT = 10 * 60
+
+# Постраничный вывод объявлений
+ADS_PER_PAGE = 2
+ADS_ESTIMATE_TOTAL = False
+COMMENTS_PER_PAGE = 20
+
+# Размер партии при скрытии объявлений с истёкшим сроком показа
+EXPIRY_BATCH_SIZE = 500
+
+# Перенос в архив объявлений старше ARCHIVE_AFTER_DAYS дней и скрытых дольше ARCHIVE_INACTIVE_AFTER_DAYS дней
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_INACTIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
+# Выборки больше порога в админке показываются с оценкой числа записей
+ADMIN_EXACT_COUNT_THRESHOLD = 10000
+
+# Размер партии при массовом удалении объявлений и их файлов
+BULK_DELETE_CHUNK_SIZE = 500
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -175,6 +273,9 @@ THUMBNAIL_ALIASES = {
     },
 }
 THUMBNAIL_BASEDIR = 'thumbnails'
+# Миниатюры создаются пулом процессов при сохранении изображения
+THUMBNAIL_PREGENERATE = True
+THUMBNAIL_WORKERS = 2
 
 # Recaptcha settings
 RECAPTCHA_PRIVATE_KEY = '6LcSdcAZAAAAAFnFGPZCFcy-Tcxjhu6V5Xg0Ftji'
@@ -1,18 +1,29 @@
 import datetime
 
-from django.contrib import admin
-
-from .models import AdvancedUser, SubRubric, SuperRubric, Ad, AdditionalImage, Comment
-from .utilities import send_activation_notification
+from django.contrib import admin, messages
+from django.contrib.admin.models import LogEntry, DELETION
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import QuerySet, Subquery
+from django.utils import timezone
+
+from .models import AdvancedUser, SubRubric, SuperRubric, Ad, AdditionalImage, Comment, OutgoingMail, SlowRequest, \
+    GUEST_AUTHOR
+from .utilities import send_bulk_activation_notifications
 from .forms import SubRubricForm
+from .paginators import EstimatedCountPaginator
 
 
 def send_activation_notifications(model_admin, request, queryset):
     """Рассылка пользователям писем с предписаниеми выполнить активацию"""
-    for user in queryset:
-        if not user.is_activated:
-            send_activation_notification(user)
-    model_admin.message_user(request, 'Письма с оповещениями отправлены')
+    batches = []
+    try:
+        sent = send_bulk_activation_notifications(queryset, progress=batches.append)
+    except Exception as error:
+        sent = batches[-1] if batches else 0
+        model_admin.message_user(request, f'Рассылка прервана после {sent} писем: {error}', messages.ERROR)
+        return
+    model_admin.message_user(request, f'Письма с оповещениями отправлены: {sent} (партий: {len(batches)})')
 
 
 send_activation_notifications.short_description = 'Отправка писем с оповещениями об активации'
@@ -43,12 +54,24 @@ class ActivatedFilter(admin.SimpleListFilter):
             return queryset.filter(is_active=False, is_activated=False, date_joined_date_lt=register_date)
         
 
+def count_deleted_ads(ads):
+    """Количество объявлений, изображений и комментариев, удаляемых вместе с объявлениями"""
+    return {
+        Ad._meta.verbose_name_plural: ads.count(),
+        AdditionalImage._meta.verbose_name_plural: AdditionalImage.objects.filter(ad__in=ads).count(),
+        Comment._meta.verbose_name_plural: Comment.objects.filter(ad__in=ads).count(),
+    }
+
+
 class AdvancedUserAdmin(admin.ModelAdmin):
     """Пользователи"""
 
     list_display = ('__str__', 'is_activated', 'date_joined')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    # Поиск по началу имён и точному адресу использует индексы по UPPER()
+    search_fields = ('^username', '=email', '^first_name', '^last_name')
     list_filter = (ActivatedFilter, )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fields = (
         ('username', 'email'),
         ('first_name', 'last_name'),
@@ -60,6 +83,20 @@ class AdvancedUserAdmin(admin.ModelAdmin):
     readonly_fields = ('last_login', 'date_joined')
     actions = (send_activation_notifications, )
 
+    def get_deleted_objects(self, objs, request):
+        """Сводка удаляемых записей без обхода каждого связанного объекта"""
+        users = objs if isinstance(objs, QuerySet) else AdvancedUser.objects.filter(pk__in=[user.pk for user in objs])
+        model_count = {AdvancedUser._meta.verbose_name_plural: len(objs)}
+        model_count.update(count_deleted_ads(Ad.objects.filter(author__in=users)))
+        perms_needed = set() if self.has_delete_permission(request) else {AdvancedUser._meta.verbose_name}
+        return [str(user) for user in objs], model_count, perms_needed, []
+
+    def delete_queryset(self, request, queryset):
+        """Массовое удаление пользователей вместе с их объявлениями"""
+        with transaction.atomic():
+            Ad.objects.filter(author__in=queryset).bulk_delete()
+            queryset.delete()
+
 
 class SubRubricInline(admin.TabularInline):
     """Редактор подрубрик"""
@@ -70,7 +107,7 @@ class SubRubricInline(admin.TabularInline):
 class SuperRubricAdmin(admin.ModelAdmin):
     """Надрубрики"""
 
-    exclude = ('super_rubric', )
+    exclude = ('super_rubric', 'ad_lifetime_days')
     inlines = (SubRubricInline, )
 
 
@@ -90,17 +127,136 @@ class AdAdmin(admin.ModelAdmin):
     """Объявления"""
 
     list_display = ('rubric', 'title', 'description', 'author', 'created_at')
-    fields = (('rubric', 'author'), 'title', 'description', 'price', 'contacts', 'image', 'is_active')
+    list_select_related = ('rubric__super_rubric', 'author')
+    search_fields = ('^title', )
+    # Вместо date_hierarchy, которая строит список лет и месяцев запросом DISTINCT по всей таблице,
+    # фильтр по дате ограничивает выборку диапазоном по индексу created_at
+    list_filter = ('created_at', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    fields = (('rubric', 'author'), 'title', 'description', 'price', 'contacts', 'image', 'is_active', 'expires_at')
     inlines = (AdditionalImageInline, )
 
+    def get_deleted_objects(self, objs, request):
+        """Сводка удаляемых записей без обхода каждого связанного объекта"""
+        ads = objs if isinstance(objs, QuerySet) else Ad.objects.filter(pk__in=[ad.pk for ad in objs])
+        model_count = count_deleted_ads(ads)
+        perms_needed = set() if self.has_delete_permission(request) else {Ad._meta.verbose_name}
+        return [str(ad) for ad in objs], model_count, perms_needed, []
+
+    def delete_queryset(self, request, queryset):
+        """Массовое удаление объявлений вместе с изображениями и комментариями"""
+        queryset.bulk_delete()
+
+
+def approve_comments(model_admin, request, queryset):
+    """Показ выбранных комментариев"""
+    model_admin.message_user(request, f'Показано комментариев: {queryset.set_active(True)}')
+
+
+approve_comments.short_description = 'Показать выбранные комментарии'
+
+
+def hide_comments(model_admin, request, queryset):
+    """Скрытие выбранных комментариев"""
+    model_admin.message_user(request, f'Скрыто комментариев: {queryset.set_active(False)}')
+
+
+hide_comments.short_description = 'Скрыть выбранные комментарии'
+
+
+def hide_author_comments(model_admin, request, queryset):
+    """Скрытие всех комментариев авторов выбранных комментариев ко всем объявлениям"""
+    if queryset.filter(author=GUEST_AUTHOR).exists():
+        # Под этим именем пишут все гости, их комментарии скрываются только по одному
+        model_admin.message_user(request, f'Комментарии автора «{GUEST_AUTHOR}» не скрыты: это все гости сайта',
+                                 messages.WARNING)
+    authors = queryset.exclude(author=GUEST_AUTHOR).select_related(None).order_by().values('author').distinct()
+    count = Comment.objects.filter(author__in=Subquery(authors)).set_active(False)
+    model_admin.message_user(request, f'Скрыто комментариев этих авторов: {count}')
+
+
+hide_author_comments.short_description = 'Скрыть все комментарии этих авторов'
+
+
+def delete_comments(model_admin, request, queryset):
+    """Удаление выбранных комментариев одним запросом с одной записью в журнале вместо записи на каждый"""
+    count = queryset.bulk_delete()
+    LogEntry.objects.log_action(
+        user_id=request.user.pk,
+        content_type_id=ContentType.objects.get_for_model(Comment).pk,
+        object_id=None,
+        object_repr=f'Комментарии: {count}',
+        action_flag=DELETION,
+        change_message=f'Массовое удаление комментариев: {count}',
+    )
+    model_admin.message_user(request, f'Удалено комментариев: {count}')
+
+
+delete_comments.short_description = 'Удалить выбранные комментарии'
+delete_comments.allowed_permissions = ('delete', )
+
 
 class CommentAdmin(admin.ModelAdmin):
     """Комментарии"""
 
     model = Comment
-    list_display = ('author', 'text', 'created_at')
-    search_fields = ('author', )
-    list_filter = ('created_at', 'is_active')
+    list_display = ('author', 'text', 'ad', 'created_at')
+    list_select_related = ('ad', )
+    search_fields = ('^author', )
+    list_filter = ('is_active', 'created_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = (approve_comments, hide_comments, hide_author_comments, delete_comments)
+
+    def get_deleted_objects(self, objs, request):
+        """Сводка удаляемых комментариев без обхода каждой записи"""
+        count = objs.count() if isinstance(objs, QuerySet) else len(objs)
+        perms_needed = set() if self.has_delete_permission(request) else {Comment._meta.verbose_name}
+        return [], {Comment._meta.verbose_name_plural: count}, perms_needed, []
+
+    def get_actions(self, request):
+        # Стандартное действие загружает каждый комментарий ради записи в журнал
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+def requeue_mail(model_admin, request, queryset):
+    """Повторная постановка писем в очередь отправки"""
+    count = queryset.exclude(status=OutgoingMail.SENT).update(
+        status=OutgoingMail.PENDING, attempts=0, next_attempt_at=timezone.now()
+    )
+    model_admin.message_user(request, f'Писем возвращено в очередь: {count}')
+
+
+requeue_mail.short_description = 'Повторить отправку'
+
+
+class OutgoingMailAdmin(admin.ModelAdmin):
+    """Исходящие письма"""
+
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', )
+    search_fields = ('recipient', )
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    actions = (requeue_mail, )
+
+
+class SlowRequestAdmin(admin.ModelAdmin):
+    """Медленные запросы"""
+
+    list_display = ('path', 'view_name', 'status_code', 'duration', 'db_time', 'template_time', 'thumbnail_time',
+                    'context_processor_time', 'view_time', 'queries', 'profile', 'created_at')
+    list_filter = ('created_at', 'view_name')
+    search_fields = ('path', )
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(AdvancedUser, AdvancedUserAdmin)
@@ -108,3 +264,5 @@ admin.site.register(SuperRubric, SuperRubricAdmin)
 admin.site.register(SubRubric, SubRubricAdmin)
 admin.site.register(Ad, AdAdmin)
 admin.site.register(Comment, CommentAdmin)
+admin.site.register(OutgoingMail, OutgoingMailAdmin)
+admin.site.register(SlowRequest, SlowRequestAdmin)
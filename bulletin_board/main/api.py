@@ -0,0 +1,114 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from .models import Ad, SubRubric, get_rubric_tree
+from .paginators import CursorPaginator
+from .thumbnails import get_thumbnail_url
+from .views import get_comments_page
+
+
+def get_fields(request):
+    """Набор полей из параметра fields= или None, если нужны все поля"""
+    fields = {name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()}
+    return fields or None
+
+
+def trim(data, fields):
+    """Удаление из словаря полей, не перечисленных в fields="""
+    if fields is None:
+        return data
+    return {name: value for name, value in data.items() if name in fields}
+
+
+def api_response(request, data):
+    """Ответ в формате JSON с сильным ETag и поддержкой 304 Not Modified"""
+    content = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    etag = '"%s"' % hashlib.sha1(content).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def serialize_image(request, image):
+    """Адреса изображения и его миниатюры"""
+    if not image:
+        return None
+    return {
+        'url': request.build_absolute_uri(image.url),
+        'thumbnail': request.build_absolute_uri(get_thumbnail_url(image, 'default')),
+    }
+
+
+def serialize_ad(request, ad, fields):
+    data = {
+        'id': ad.pk,
+        'rubric': ad.rubric_id,
+        'title': ad.title,
+        'description': ad.description,
+        'price': ad.price,
+        'contacts': ad.contacts,
+        'image': serialize_image(request, ad.image),
+        'created_at': ad.created_at,
+        'expires_at': ad.expires_at,
+        'comment_count': ad.comment_count,
+        'last_comment_at': ad.last_comment_at,
+    }
+    return trim(data, fields)
+
+
+def serialize_page(page, items):
+    return {'results': items, 'next': page.next_cursor, 'previous': page.previous_cursor}
+
+
+@require_safe
+def rubrics(request):
+    """Дерево рубрик"""
+    return api_response(request, {'results': get_rubric_tree()})
+
+
+@require_safe
+def rubric_ads(request, pk):
+    """Показываемые объявления рубрики"""
+    rubric = get_object_or_404(SubRubric, pk=pk)
+    ads = Ad.objects.visible().filter(rubric=rubric.pk)
+    ordering = ('-created_at', '-pk')
+    if request.GET.get('keyword'):
+        ads = ads.search(request.GET['keyword'])
+        ordering = ('-rank', ) + ordering
+    page = CursorPaginator(ads, settings.ADS_PER_PAGE, ordering).get_page(request.GET.get('cursor'))
+    fields = get_fields(request)
+    return api_response(request, serialize_page(page, [serialize_ad(request, ad, fields) for ad in page]))
+
+
+@require_safe
+def ad_detail(request, pk):
+    """Объявление с рубрикой и дополнительными изображениями"""
+    ads = Ad.objects.select_related('rubric').prefetch_related('additionalimage_set')
+    ad = get_object_or_404(ads.visible(), pk=pk)
+    data = serialize_ad(request, ad, None)
+    data['rubric'] = {'id': ad.rubric.pk, 'name': ad.rubric.name}
+    data['additional_images'] = [serialize_image(request, ai.image) for ai in ad.additionalimage_set.all()]
+    return api_response(request, trim(data, get_fields(request)))
+
+
+@require_safe
+def ad_comments(request, pk):
+    """Показываемые комментарии к объявлению"""
+    get_object_or_404(Ad.objects.visible().only('pk'), pk=pk)
+    page = get_comments_page(pk, request.GET.get('cursor'))
+    fields = get_fields(request)
+    items = [
+        trim({'id': comment.pk, 'author': comment.author, 'text': comment.text, 'created_at': comment.created_at},
+             fields)
+        for comment in page
+    ]
+    return api_response(request, serialize_page(page, items))
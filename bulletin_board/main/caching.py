@@ -0,0 +1,75 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import count_cache_lookup
+
+HITS_KEY = 'fragment_cache:hits'
+MISSES_KEY = 'fragment_cache:misses'
+
+
+def _version_key(kind, pk):
+    return f'fragment_version:{kind}:{pk}'
+
+
+def _new_version():
+    return format(time.time_ns(), 'x')
+
+
+def get_fragment_version(kind, pk):
+    """Текущая версия фрагментов объявления или рубрики"""
+    key = _version_key(kind, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_fragment_versions(kind, pks):
+    """Смена версии делает устаревшими все кэшированные фрагменты без удаления ключей по шаблону"""
+    keys = {_version_key(kind, pk) for pk in pks}
+    if not keys:
+        return
+    # Версия меняется после фиксации транзакции, иначе параллельный запрос сохранит
+    # под новой версией фрагмент, отрисованный по ещё не зафиксированным данным
+    transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, _new_version()), None))
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def make_fragment_key(name, kind, pk, vary_on=()):
+    """Ключ фрагмента, включающий версию объявления или рубрики"""
+    version = get_fragment_version(kind, pk)
+    vary = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'fragment:{name}:{kind}:{pk}:{version}:{vary}'
+
+
+def get_cached_fragment(key, render):
+    """Фрагмент из кэша или результат его отрисовки с учётом попаданий и промахов"""
+    content = cache.get(key)
+    count_cache_lookup('fragment', content is not None)
+    if content is None:
+        _increment(MISSES_KEY)
+        content = render()
+        cache.set(key, content, settings.FRAGMENT_CACHE_TIMEOUT)
+    else:
+        _increment(HITS_KEY)
+    return content
+
+
+def get_fragment_cache_stats():
+    """Счётчики попаданий и промахов кэша фрагментов"""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else None}
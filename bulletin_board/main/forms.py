@@ -3,6 +3,7 @@ from django.contrib.auth import password_validation
 from django.core.exceptions import ValidationError
 from snowpenguin.django.recaptcha3.fields import ReCaptchaField
 
+from .metrics import observe_upload
 from .models import AdvancedUser, user_registered, SuperRubric, SubRubric, Ad, AdditionalImage, Comment
 
 
@@ -77,14 +78,29 @@ class SearchAdsForm(forms.Form):
 class AdForm(forms.ModelForm):
     """Форма добавления объявления"""
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        observe_upload('AdForm', image)
+        return image
+
     class Meta:
         model = Ad
         fields = '__all__'
+        exclude = ('expires_at', )
         widgets = {'author': forms.HiddenInput}
 
 
 # Нбор форм для добавления дополнительных изображений
-AIFormSet = forms.inlineformset_factory(Ad, AdditionalImage, fields="__all__")
+class AIForm(forms.ModelForm):
+    """Форма дополнительного изображения"""
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        observe_upload('AIFormSet', image)
+        return image
+
+
+AIFormSet = forms.inlineformset_factory(Ad, AdditionalImage, form=AIForm, fields="__all__")
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,88 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(\s*,\s*%s)+\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+class QueryBudgetExceeded(Exception):
+    """Превышен бюджет SQL-запросов"""
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса без значений параметров и длины списков IN"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('(%s, ...)', sql)
+
+
+class QueryRecorder:
+    """Запись SQL-запросов, выполняемых через все подключения к базам данных"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def duplicates(self, threshold=None):
+        """Повторяющиеся формы запросов, подозрительные на N+1"""
+        threshold = threshold or settings.QUERY_BUDGET_DUPLICATE_THRESHOLD
+        shapes = Counter(fingerprint(sql) for sql, duration in self.queries)
+        return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+    def report(self):
+        """Сводка по записанным запросам"""
+        return {
+            'count': self.count,
+            'time': round(self.total_time, 6),
+            'duplicates': self.duplicates(),
+        }
+
+
+def get_query_budget(view_name):
+    """Бюджет запросов для имени маршрута или None, если он не задан"""
+    return settings.QUERY_BUDGETS.get(view_name)
+
+
+@contextmanager
+def query_budget(max_queries, allow_duplicates=True):
+    """
+    Проверка числа запросов в тестах:
+    with query_budget(3): self.client.get(reverse('main:index'))
+    """
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise QueryBudgetExceeded(f'Выполнено {recorder.count} запросов при бюджете {max_queries}')
+    duplicates = recorder.duplicates()
+    if duplicates and not allow_duplicates:
+        raise QueryBudgetExceeded(f'Повторяющиеся запросы: {duplicates}')
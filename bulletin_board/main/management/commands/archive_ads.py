@@ -0,0 +1,49 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from main.models import Ad, archive_ads
+
+
+class Command(BaseCommand):
+    """Перенос старых и давно скрытых объявлений в архивные таблицы"""
+
+    help = 'Переносит старые и давно скрытые объявления вместе с изображениями и комментариями в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age-days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Возраст объявления в днях, после которого оно переносится в архив')
+        parser.add_argument('--inactive-days', type=int, default=settings.ARCHIVE_INACTIVE_AFTER_DAYS,
+                            help='Сколько дней скрытое объявление остаётся в основной таблице')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help='Количество объявлений, переносимых в одной транзакции')
+        parser.add_argument('--pause', type=float, default=0, help='Пауза в секундах между партиями')
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать объявления для переноса')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        candidates = Ad.objects.filter(
+            Q(created_at__lt=now - datetime.timedelta(days=options['age_days'])) |
+            Q(is_active=False, updated_at__lt=now - datetime.timedelta(days=options['inactive_days']))
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Объявлений для переноса в архив: {candidates.count()}')
+            return
+        # Перенесённые объявления удаляются из основной таблицы, поэтому прерванный перенос продолжается с начала
+        archived = 0
+        last_pk = 0
+        while True:
+            pks = list(candidates.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            archived += archive_ads(pks)
+            last_pk = pks[-1]
+            self.stderr.write(f'Перенесено в архив: {archived}')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив объявлений: {archived}'))
@@ -0,0 +1,171 @@
+import io
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, \
+    teardown_test_environment, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from main.instrumentation import QueryRecorder
+from main.models import AdvancedUser, SuperRubric, SubRubric, Ad, AdditionalImage, Comment
+from main.storage import content_storage
+
+COLORS = ('red', 'green', 'blue', 'yellow', 'purple', 'orange', 'gray', 'brown')
+
+
+def percentile(values, percent):
+    """Значение перцентиля методом ближайшего ранга"""
+    values = sorted(values)
+    index = max(0, int(round(percent / 100 * len(values))) - 1)
+    return values[index]
+
+
+class Command(BaseCommand):
+    """Замер производительности основных страниц на синтетических данных"""
+
+    help = 'Заполняет тестовую базу синтетическими данными и замеряет время ответа основных страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--super-rubrics', type=int, default=5, help='Количество надрубрик')
+        parser.add_argument('--sub-rubrics', type=int, default=4, help='Количество подрубрик в каждой надрубрике')
+        parser.add_argument('--ads', type=int, default=1000, help='Количество объявлений')
+        parser.add_argument('--images', type=int, default=2, help='Дополнительных изображений на объявление')
+        parser.add_argument('--comments', type=int, default=10, help='Комментариев на объявление')
+        parser.add_argument('--iterations', type=int, default=50, help='Количество запросов к каждой странице')
+        parser.add_argument('--warmup', type=int, default=5, help='Количество разогревочных запросов')
+        parser.add_argument('--no-cache', action='store_true', help='Замер без кэша')
+        parser.add_argument('--output', help='Файл для отчёта в формате JSON')
+        parser.add_argument('--baseline', help='Файл с эталонными результатами для сравнения')
+        parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как эталонные')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимое относительное ухудшение показателей')
+
+    def handle(self, *args, **options):
+        cache_backend = 'dummy.DummyCache' if options['no_cache'] else 'locmem.LocMemCache'
+        media_root = tempfile.mkdtemp(prefix='benchmark_media_')
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, THUMBNAIL_PREGENERATE=False,
+                                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.' + cache_backend}}):
+                dataset = self.seed(options)
+                report = {'dataset': dataset, 'views': self.run_views(dataset, options)}
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            if options['save_baseline']:
+                with open(options['baseline'], 'w') as file:
+                    file.write(output)
+                self.stdout.write(self.style.SUCCESS(f'Эталонные результаты сохранены в {options["baseline"]}'))
+            else:
+                self.compare(report, options['baseline'], options['threshold'])
+
+    def seed(self, options):
+        """Заполнение базы синтетическими данными"""
+        images = []
+        for color in COLORS:
+            buffer = io.BytesIO()
+            Image.new('RGB', (640, 480), color).save(buffer, 'JPEG')
+            images.append(content_storage.save('benchmark.jpg', ContentFile(buffer.getvalue())))
+
+        author = AdvancedUser.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark')
+        super_rubrics = [SuperRubric.objects.create(name=f'Надрубрика {i}', order=i)
+                         for i in range(options['super_rubrics'])]
+        sub_rubrics = [SubRubric.objects.create(name=f'Рубрика {i}-{j}', order=j, super_rubric=super_rubric)
+                       for i, super_rubric in enumerate(super_rubrics) for j in range(options['sub_rubrics'])]
+        Ad.objects.bulk_create(
+            Ad(rubric=sub_rubrics[i % len(sub_rubrics)], author=author, title=f'Объявление {i}',
+               description=f'Описание синтетического объявления номер {i}', price=i, contacts='benchmark',
+               image=images[i % len(images)])
+            for i in range(options['ads'])
+        )
+        # Не все СУБД возвращают ключи записей, созданных bulk_create()
+        ads = list(Ad.objects.only('pk').order_by('pk'))
+        AdditionalImage.objects.bulk_create(
+            AdditionalImage(ad=ad, image=images[(i + j) % len(images)])
+            for i, ad in enumerate(ads) for j in range(options['images'])
+        )
+        Comment.objects.bulk_create(
+            Comment(ad=ad, author=f'Гость {j}', text=f'Комментарий {j}')
+            for ad in ads for j in range(options['comments'])
+        )
+        return {
+            'super_rubrics': len(super_rubrics), 'sub_rubrics': len(sub_rubrics), 'ads': len(ads),
+            'images_per_ad': options['images'], 'comments_per_ad': options['comments'],
+            'author_pk': author.pk, 'rubric_pk': sub_rubrics[0].pk, 'ad_pk': ads[0].pk,
+        }
+
+    def run_views(self, dataset, options):
+        """Многократный запрос каждой страницы через тестовый клиент"""
+        anonymous = Client()
+        authorized = Client()
+        authorized.force_login(AdvancedUser.objects.get(pk=dataset['author_pk']))
+        views = {
+            'main:index': (anonymous, reverse('main:index')),
+            'main:by_rubric': (anonymous, reverse('main:by_rubric', kwargs={'pk': dataset['rubric_pk']})),
+            'main:detail': (anonymous, reverse('main:detail', kwargs={'rubric_pk': dataset['rubric_pk'],
+                                                                      'pk': dataset['ad_pk']})),
+            'main:profile': (authorized, reverse('main:profile')),
+        }
+        results = {}
+        for view_name, (client, url) in views.items():
+            for i in range(options['warmup']):
+                client.get(url)
+            timings, queries = [], []
+            for i in range(options['iterations']):
+                with QueryRecorder() as recorder:
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries.append(recorder.count)
+                if response.status_code != 200:
+                    raise CommandError(f'{view_name}: код ответа {response.status_code}')
+            # Память замеряется отдельно, так как tracemalloc замедляет выполнение
+            tracemalloc.start()
+            client.get(url)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[view_name] = {
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'queries': max(queries),
+                'peak_memory_kb': round(peak_memory / 1024, 1),
+            }
+            self.stderr.write(f'{view_name}: {results[view_name]}')
+        return results
+
+    def compare(self, report, baseline_path, threshold):
+        """Сравнение результатов с эталонными"""
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        regressions = []
+        for view_name, current in report['views'].items():
+            expected = baseline['views'].get(view_name)
+            if not expected:
+                continue
+            if current['queries'] > expected['queries']:
+                regressions.append(f'{view_name}: запросов {current["queries"]} вместо {expected["queries"]}')
+            for metric in ('p95_ms', 'p99_ms', 'peak_memory_kb'):
+                if current[metric] > expected[metric] * (1 + threshold):
+                    regressions.append(f'{view_name}: {metric} {current[metric]} против {expected[metric]}')
+        if regressions:
+            raise CommandError('Обнаружено ухудшение производительности:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Ухудшений производительности не обнаружено'))
@@ -0,0 +1,43 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.models import Ad
+from main.utilities import send_expiry_notifications
+
+
+class Command(BaseCommand):
+    """Скрытие или удаление объявлений с истёкшим сроком показа"""
+
+    help = 'Скрывает или удаляет объявления с истёкшим сроком показа партиями и оповещает авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EXPIRY_BATCH_SIZE,
+                            help='Количество объявлений, обрабатываемых в одной транзакции')
+        parser.add_argument('--purge', action='store_true', help='Удалять объявления вместо скрытия')
+        parser.add_argument('--no-notify', action='store_true', help='Не оповещать авторов')
+
+    def handle(self, *args, **options):
+        expired = Ad.objects.filter(expires_at__lte=timezone.now())
+        if not options['purge']:
+            expired = expired.filter(is_active=True)
+        notices = defaultdict(list)
+        processed = 0
+        last_pk = 0
+        while True:
+            # Каждая партия выбирается по ключу и обрабатывается в отдельной короткой транзакции
+            rows = list(expired.filter(pk__gt=last_pk).order_by('pk')
+                        .values_list('pk', 'author_id', 'title')[:options['batch_size']])
+            if not rows:
+                break
+            batch = Ad.objects.filter(pk__in=[pk for pk, author_id, title in rows])
+            processed += batch.bulk_delete() if options['purge'] else batch.bulk_deactivate()
+            for pk, author_id, title in rows:
+                notices[author_id].append(title)
+            last_pk = rows[-1][0]
+            self.stderr.write(f'Обработано объявлений: {processed}')
+        queued = 0 if options['no_notify'] else send_expiry_notifications(notices, purged=options['purge'])
+        action = 'Удалено' if options['purge'] else 'Скрыто'
+        self.stdout.write(self.style.SUCCESS(f'{action} объявлений: {processed}, писем в очереди: {queued}'))
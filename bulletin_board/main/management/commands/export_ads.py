@@ -0,0 +1,71 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.models import Ad
+
+FIELDS = ('id', 'super_rubric', 'rubric', 'author', 'title', 'description', 'price', 'contacts', 'image',
+          'is_active', 'created_at')
+
+
+def serialize_ad(ad):
+    """Строка выгрузки объявления"""
+    return {
+        'id': ad.pk,
+        'super_rubric': ad.rubric.super_rubric.name,
+        'rubric': ad.rubric.name,
+        'author': ad.author.username,
+        'title': ad.title,
+        'description': ad.description,
+        'price': ad.price,
+        'contacts': ad.contacts,
+        'image': ad.image.name,
+        'is_active': ad.is_active,
+        'created_at': ad.created_at.isoformat(),
+    }
+
+
+class Command(BaseCommand):
+    """Потоковая выгрузка объявлений в JSONL или CSV"""
+
+    help = 'Выгружает объявления в файл JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или - для стандартного вывода')
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help='Формат файла, по умолчанию по расширению')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Количество записей, читаемых за раз')
+        parser.add_argument('--active-only', action='store_true', help='Только показываемые объявления')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        ads = Ad.objects.select_related('rubric__super_rubric', 'author').order_by('pk')
+        if options['active_only']:
+            ads = ads.filter(is_active=True)
+
+        file = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        try:
+            if file_format == 'csv':
+                writer = csv.DictWriter(file, FIELDS)
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                def write(row):
+                    file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            start = time.perf_counter()
+            count = 0
+            for count, ad in enumerate(ads.iterator(chunk_size=options['chunk_size']), 1):
+                write(serialize_ad(ad))
+                if count % options['chunk_size'] == 0:
+                    self.report(count, start)
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        self.report(count, start)
+
+    def report(self, count, start):
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f'Выгружено {count} объявлений, {count / elapsed if elapsed else 0:.0f} в секунду')
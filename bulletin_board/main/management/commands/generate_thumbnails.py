@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.models import Ad, AdditionalImage
+from main.thumbnails import create_executor, generate_thumbnails
+
+
+class Command(BaseCommand):
+    """Создание недостающих миниатюр для уже загруженных изображений"""
+
+    help = 'Создаёт недостающие миниатюры изображений объявлений в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+                            help='Количество процессов')
+        parser.add_argument('--chunk-size', type=int, default=20,
+                            help='Количество изображений, передаваемых процессу за раз')
+
+    def handle(self, *args, **options):
+        names = set(Ad.objects.exclude(image='').values_list('image', flat=True).iterator())
+        names.update(AdditionalImage.objects.values_list('image', flat=True).iterator())
+        self.stdout.write(f'Изображений: {len(names)}')
+        created = 0
+        with create_executor(options['workers']) as executor:
+            results = executor.map(generate_thumbnails, sorted(names), chunksize=options['chunk_size'])
+            for done, count in enumerate(results, 1):
+                created += count
+                if done % 100 == 0:
+                    self.stdout.write(f'Обработано {done} из {len(names)}')
+        self.stdout.write(self.style.SUCCESS(f'Создано миниатюр: {created}'))
@@ -0,0 +1,108 @@
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.caching import bump_fragment_versions
+from main.models import Ad, SubRubric, AdvancedUser, update_rubric_ad_counts, get_default_expiry
+
+
+class Command(BaseCommand):
+    """Потоковая загрузка объявлений из JSONL или CSV"""
+
+    help = 'Загружает объявления из файла JSONL или CSV партиями через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help='Формат файла, по умолчанию по расширению')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество записей в одной транзакции')
+        parser.add_argument('--strict', action='store_true', help='Прервать загрузку при первой ошибке')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        # Рубрики и пользователи ищутся по именам в памяти, а не запросом на каждую строку
+        self.rubrics = {}
+        for rubric in SubRubric.objects.only('pk', 'name', 'ad_lifetime_days'):
+            self.rubrics[rubric.name] = self.rubrics[str(rubric.pk)] = rubric
+        self.authors = dict(AdvancedUser.objects.values_list('username', 'pk'))
+
+        imported = skipped = 0
+        rubric_ids = set()
+        batch = []
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            # Строки JSONL разбираются по одной, чтобы ошибка в строке не прерывала загрузку
+            rows = csv.DictReader(file) if file_format == 'csv' else file
+            for line_number, row in enumerate(rows, 1):
+                if isinstance(row, str) and not row.strip():
+                    continue
+                try:
+                    ad = self.build_ad(self.parse_row(row))
+                except (ValidationError, ValueError, KeyError) as error:
+                    if options['strict']:
+                        raise CommandError(f'Строка {line_number}: {error}')
+                    skipped += 1
+                    self.stderr.write(f'Строка {line_number} пропущена: {error}')
+                    continue
+                batch.append(ad)
+                rubric_ids.add(ad.rubric_id)
+                if len(batch) >= options['batch_size']:
+                    imported += self.write(batch)
+                    batch = []
+                    self.report(imported, skipped, start)
+        if batch:
+            imported += self.write(batch)
+        bump_fragment_versions('rubric', rubric_ids)
+        self.report(imported, skipped, start)
+
+    def parse_row(self, row):
+        """Словарь полей из записи CSV или строки JSONL"""
+        if isinstance(row, str):
+            row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValidationError('строка должна содержать объект JSON')
+        return row
+
+    def build_ad(self, row):
+        """Объявление из строки файла с проверкой по модели Ad"""
+        rubric = self.rubrics.get(str(row['rubric']))
+        if rubric is None:
+            raise ValidationError(f'неизвестная рубрика {row["rubric"]}')
+        author_id = self.authors.get(row['author'])
+        if author_id is None:
+            raise ValidationError(f'неизвестный пользователь {row["author"]}')
+        is_active = row.get('is_active', True)
+        if isinstance(is_active, str):
+            is_active = is_active.lower() in ('1', 'true', 'yes')
+        ad = Ad(
+            rubric_id=rubric.pk,
+            author_id=author_id,
+            expires_at=get_default_expiry(rubric),
+            title=row['title'],
+            description=row['description'],
+            price=row.get('price') or 0,
+            contacts=row['contacts'],
+            image=row.get('image') or '',
+            is_active=is_active,
+        )
+        ad.full_clean(exclude=('rubric', 'author', 'image', 'search_vector'))
+        return ad
+
+    def write(self, batch):
+        deltas = {}
+        for ad in batch:
+            if ad.is_active:
+                deltas[ad.rubric_id] = deltas.get(ad.rubric_id, 0) + 1
+        with transaction.atomic():
+            Ad.objects.bulk_create(batch)
+            update_rubric_ad_counts(deltas)
+        return len(batch)
+
+    def report(self, imported, skipped, start):
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f'Загружено {imported}, пропущено {skipped}, '
+                          f'{imported / elapsed if elapsed else 0:.0f} объявлений в секунду')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Comment
+
+
+class Command(BaseCommand):
+    """Массовая модерация комментариев по автору или тексту"""
+
+    help = 'Показывает, скрывает или удаляет все комментарии, подходящие под условия, одним запросом'
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument('--approve', action='store_true', help='Показать комментарии')
+        action.add_argument('--hide', action='store_true', help='Скрыть комментарии')
+        action.add_argument('--delete', action='store_true', help='Удалить комментарии')
+        parser.add_argument('--author', help='Точное имя автора')
+        parser.add_argument('--text', help='Фрагмент текста без учёта регистра')
+        parser.add_argument('--text-regex', help='Регулярное выражение для текста без учёта регистра')
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать подходящие комментарии')
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ('author', 'text', 'text_regex')):
+            raise CommandError('Не задано ни одного условия отбора комментариев')
+        comments = Comment.objects.all()
+        if options['author']:
+            comments = comments.filter(author=options['author'])
+        if options['text']:
+            comments = comments.filter(text__icontains=options['text'])
+        if options['text_regex']:
+            comments = comments.filter(text__iregex=options['text_regex'])
+        if options['dry_run']:
+            self.stdout.write(f'Подходящих комментариев: {comments.count()}')
+            return
+        if options['delete']:
+            self.stdout.write(self.style.SUCCESS(f'Удалено комментариев: {comments.bulk_delete()}'))
+        else:
+            count = comments.set_active(bool(options['approve']))
+            action = 'Показано' if options['approve'] else 'Скрыто'
+            self.stdout.write(self.style.SUCCESS(f'{action} комментариев: {count}'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Ad, recount_rubric_ad_counts, recount_ad_comment_counts
+
+
+class Command(BaseCommand):
+    """Пересчёт счётчиков объявлений и комментариев"""
+
+    help = 'Пересчитывает счётчики объявлений рубрик и комментариев объявлений, исправляя расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество объявлений, пересчитываемых в одной транзакции')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount_rubric_ad_counts()
+        self.stdout.write(f'Исправлено счётчиков рубрик: {fixed}')
+
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(Ad.objects.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            with transaction.atomic():
+                fixed += recount_ad_comment_counts(Ad.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]))
+            last_pk = pks[-1]
+        self.stdout.write(f'Исправлено счётчиков объявлений: {fixed}')
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.utilities import send_queued_mail
+
+
+class Command(BaseCommand):
+    """Отправка писем из очереди исходящей почты"""
+
+    help = 'Отправляет письма из очереди исходящей почты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.MAIL_QUEUE_BATCH_SIZE,
+                            help='Количество писем, отправляемых через одно соединение')
+        parser.add_argument('--loop', action='store_true',
+                            help='Не завершать работу, а периодически проверять очередь')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза в секундах между проверками пустой очереди')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_mail(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Отправлено: {sent}, ошибок: {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
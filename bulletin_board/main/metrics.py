@@ -0,0 +1,41 @@
+import os
+
+from django.core.files.uploadedfile import UploadedFile
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+
+# При заданной переменной окружения каждый процесс пишет значения в свои файлы в общем каталоге
+MULTIPROCESS_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_LATENCY = Histogram('bb_request_duration_seconds', 'Время обработки запроса', ['view'])
+RESPONSES = Counter('bb_responses_total', 'Ответы по кодам состояния', ['view', 'status'])
+DB_QUERIES = Histogram('bb_db_queries', 'Количество SQL-запросов на запрос', ['view'],
+                       buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+DB_TIME = Histogram('bb_db_duration_seconds', 'Время выполнения SQL-запросов на запрос', ['view'])
+CACHE_LOOKUPS = Counter('bb_cache_lookups_total', 'Обращения к кэшу', ['cache', 'result'])
+NOTIFICATIONS = Counter('bb_notifications_total', 'Оповещения, поставленные в очередь', ['kind', 'result'])
+MAIL_DELIVERIES = Counter('bb_mail_deliveries_total', 'Попытки отправки писем из очереди', ['result'])
+UPLOAD_SIZE = Histogram('bb_upload_size_bytes', 'Размер загруженных изображений', ['form'],
+                        buckets=(16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2))
+
+
+def count_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.labels(cache_name, 'hit' if hit else 'miss').inc()
+
+
+def observe_upload(form_name, file):
+    # Уже сохранённые файлы при правке объявления не учитываются
+    if isinstance(file, UploadedFile):
+        UPLOAD_SIZE.labels(form_name).observe(file.size)
+
+
+def get_registry():
+    """Реестр текущего процесса или сводный реестр всех процессов"""
+    if os.environ.get(MULTIPROCESS_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    return generate_latest(get_registry())
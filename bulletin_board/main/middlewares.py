@@ -1,17 +1,165 @@
-from .models import SubRubric
+import cProfile
+import datetime
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack
 
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, DatabaseError, OperationalError
+from django.utils import timezone
 
+from .instrumentation import QueryRecorder, QueryBudgetExceeded, get_query_budget
+from .metrics import REQUEST_LATENCY, RESPONSES, DB_QUERIES, DB_TIME
+from .models import get_rubric_tree, SlowRequest
+from .profiling import start_timings, stop_timings, time_query, timed_function
+from .routers import reset_state, has_written, get_current_replica, fall_back_to_primary
+
+logger = logging.getLogger(__name__)
+
+
+@timed_function('context-processor')
 def bb_context_processor(request):
-    context = {'rubrics': SubRubric.objects.all(), 'keyword': '', 'all': ''}
+    context = {'rubric_tree': get_rubric_tree(), 'keyword': '', 'all': ''}
     if 'keyword' in request.GET:
         keyword = request.GET['keyword']
         context['keyword'] = '?keyword=' + keyword
         context['all'] = context['keyword']
-    if 'page' in request.GET:
-        page = request.GET['page']
-        if page != 1:
-            if context['all']:
-                context['all'] += '&page' + page
-            else:
-                context['all'] = '?page' + page
+    if 'cursor' in request.GET:
+        cursor = request.GET['cursor']
+        if context['all']:
+            context['all'] += '&cursor=' + cursor
+        else:
+            context['all'] = '?cursor=' + cursor
     return context
+
+
+class QueryBudgetMiddleware:
+    """Учёт SQL-запросов каждого запроса и проверка бюджетов запросов по имени маршрута"""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        view_name = request.resolver_match.view_name if request.resolver_match else request.path
+        for shape, count in recorder.duplicates().items():
+            logger.warning('Возможная проблема N+1 в %s: %s раз выполнен запрос %s', view_name, count, shape)
+        budget = get_query_budget(view_name)
+        if budget is not None and recorder.count > budget:
+            message = f'{view_name}: выполнено {recorder.count} запросов при бюджете {budget}'
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """Чтение с основной базы в течение заданного времени после записи"""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_state(pinned=settings.REPLICA_STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(settings.REPLICA_STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                    httponly=True, samesite='Lax')
+        finally:
+            reset_state()
+        return response
+
+    def process_exception(self, request, exception):
+        """Повтор безопасного запроса на основной базе, если чтение с реплики прервалось"""
+        replica = get_current_replica()
+        if not isinstance(exception, OperationalError) or replica is None or has_written() \
+                or request.method not in ('GET', 'HEAD') or request.resolver_match is None:
+            return None
+        logger.warning('Чтение с реплики %s прервано, запрос повторён на основной базе: %s', replica, exception)
+        fall_back_to_primary()
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
+
+
+class ProfilingMiddleware:
+    """Заголовок Server-Timing, выборочное профилирование и журнал медленных запросов"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = start_timings()
+        profiler = cProfile.Profile() if random.random() < settings.PROFILING_SAMPLE_RATE else None
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_query))
+                if profiler:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler:
+                        profiler.disable()
+        finally:
+            stop_timings()
+        breakdown = timings.breakdown()
+        response['Server-Timing'] = ', '.join(f'{name};dur={duration:.1f}' for name, duration in breakdown.items())
+        view_name = request.resolver_match.view_name if request.resolver_match else ''
+        profile = self.save_profile(profiler, view_name) if profiler else ''
+        if profile or breakdown['total'] >= settings.PROFILING_SLOW_THRESHOLD:
+            self.log_request(request, response, view_name, breakdown, timings.queries, profile)
+        return response
+
+    def save_profile(self, profiler, view_name):
+        """Сохранение профиля в файл для просмотра через pstats или snakeviz"""
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{view_name.replace(":", "-") or "unknown"}.prof'
+        profiler.dump_stats(os.path.join(settings.PROFILING_DIR, name))
+        return name
+
+    def log_request(self, request, response, view_name, breakdown, queries, profile):
+        try:
+            SlowRequest.objects.create(
+                path=request.get_full_path()[:255], view_name=view_name, method=request.method,
+                status_code=response.status_code, duration=breakdown['total'], db_time=breakdown['db'],
+                template_time=breakdown['template'], thumbnail_time=breakdown['thumbnail'],
+                context_processor_time=breakdown['context-processor'], view_time=breakdown['view'],
+                queries=queries, profile=profile,
+            )
+            keep_since = timezone.now() - datetime.timedelta(days=settings.PROFILING_KEEP_DAYS)
+            SlowRequest.objects.filter(created_at__lt=keep_since).delete()
+        except DatabaseError:
+            logger.exception('Не удалось сохранить сведения о медленном запросе %s', request.path)
+
+
+class MetricsMiddleware:
+    """Сбор метрик времени ответа, кодов состояния и SQL-запросов по именам маршрутов"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        # Имя маршрута вместо адреса, чтобы число меток не зависело от данных
+        view_name = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        REQUEST_LATENCY.labels(view_name).observe(time.perf_counter() - start)
+        RESPONSES.labels(view_name, str(response.status_code)).inc()
+        DB_QUERIES.labels(view_name).observe(recorder.count)
+        DB_TIME.labels(view_name).observe(recorder.total_time)
+        return response
@@ -0,0 +1,58 @@
+# Generated by Django 3.0.12 on 2026-10-18 10:00
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Запросы используют ту же конфигурацию, см. main.models.SEARCH_CONFIG
+CREATE_SEARCH_VECTOR_SQL = """
+CREATE FUNCTION main_ad_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_ad_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON main_ad
+    FOR EACH ROW EXECUTE PROCEDURE main_ad_search_vector_update();
+
+UPDATE main_ad SET title = title;
+
+CREATE INDEX main_ad_search_vector_gin ON main_ad USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP INDEX IF EXISTS main_ad_search_vector_gin;
+DROP TRIGGER IF EXISTS main_ad_search_vector_trigger ON main_ad;
+DROP FUNCTION IF EXISTS main_ad_search_vector_update();
+"""
+
+
+def create_search_vector(apps, schema_editor):
+    """Триггер и GIN-индекс поискового вектора создаются только на PostgreSQL"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_VECTOR_SQL)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_comment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
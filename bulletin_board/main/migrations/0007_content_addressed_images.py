@@ -0,0 +1,25 @@
+# Generated by Django 3.0.12 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import main.storage
+import main.utilities
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_outgoingmail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ad',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=main.storage.ContentAddressedStorage(), upload_to=main.utilities.get_timestamp_path, verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='additionalimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=main.storage.ContentAddressedStorage(), upload_to=main.utilities.get_timestamp_path, verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.0.12 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(is_active=True), fields=['rubric', '-created_at', '-id'], name='main_ad_rubric_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(is_active=True), fields=['-created_at', '-id'], name='main_ad_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(is_active=True), fields=['ad', 'created_at', 'id'], name='main_comment_ad_active_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.0.12 on 2026-10-18 14:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def compute_counters(apps, schema_editor):
+    """Начальные значения счётчиков объявлений и комментариев"""
+    Rubric = apps.get_model('main', 'Rubric')
+    Ad = apps.get_model('main', 'Ad')
+    Comment = apps.get_model('main', 'Comment')
+    ads = Ad.objects.filter(rubric=OuterRef('pk'), is_active=True).order_by()
+    Rubric.objects.update(
+        ad_count=Coalesce(Subquery(ads.values('rubric').annotate(count=Count('pk')).values('count')), 0)
+    )
+    comments = Comment.objects.filter(ad=OuterRef('pk'), is_active=True).order_by()
+    Ad.objects.update(
+        comment_count=Coalesce(Subquery(comments.values('ad').annotate(count=Count('pk')).values('count')), 0),
+        last_comment_at=Subquery(comments.order_by('-created_at').values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_ad_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rubric',
+            name='ad_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Показываемых объявлений'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Показываемых комментариев'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
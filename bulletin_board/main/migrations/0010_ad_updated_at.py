@@ -0,0 +1,29 @@
+# Generated by Django 3.0.12 on 2026-10-18 15:00
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_updated_at(apps, schema_editor):
+    """Время изменения существующих объявлений - время публикации или последнего комментария"""
+    Ad = apps.get_model('main', 'Ad')
+    Ad.objects.update(updated_at=F('created_at'))
+    Ad.objects.filter(last_comment_at__gt=F('updated_at')).update(updated_at=F('last_comment_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.12 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_ad_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, verbose_name='Адрес')),
+                ('view_name', models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Маршрут')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('duration', models.FloatField(verbose_name='Всего, мс')),
+                ('db_time', models.FloatField(verbose_name='База данных, мс')),
+                ('template_time', models.FloatField(verbose_name='Шаблоны, мс')),
+                ('thumbnail_time', models.FloatField(verbose_name='Миниатюры, мс')),
+                ('context_processor_time', models.FloatField(verbose_name='Обработчики контекста, мс')),
+                ('view_time', models.FloatField(verbose_name='Представление, мс')),
+                ('queries', models.PositiveIntegerField(verbose_name='Запросов к базе')),
+                ('profile', models.CharField(blank=True, max_length=255, verbose_name='Файл профиля')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Выполнен')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ['-duration'],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.12 on 2026-10-18 17:00
+
+from django.db import migrations
+
+
+# Индексы соответствуют выражению UPPER(поле::text), которое Django строит для поиска по началу строки.
+# CONCURRENTLY не блокирует запись в большие таблицы, но выполняется только вне транзакции и по одной команде
+CREATE_SEARCH_INDEXES_SQL = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS main_ad_title_upper_like '
+    'ON main_ad (UPPER(title::text) text_pattern_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS main_comment_author_upper_like '
+    'ON main_comment (UPPER(author::text) text_pattern_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS main_user_username_upper_like '
+    'ON main_advanceduser (UPPER(username::text) text_pattern_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS main_user_email_upper ON main_advanceduser (UPPER(email::text))',
+)
+
+DROP_SEARCH_INDEXES_SQL = (
+    'DROP INDEX CONCURRENTLY IF EXISTS main_ad_title_upper_like',
+    'DROP INDEX CONCURRENTLY IF EXISTS main_comment_author_upper_like',
+    'DROP INDEX CONCURRENTLY IF EXISTS main_user_username_upper_like',
+    'DROP INDEX CONCURRENTLY IF EXISTS main_user_email_upper',
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """Функциональные индексы для поиска в админке создаются только на PostgreSQL"""
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_SEARCH_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_SEARCH_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0011_slowrequest'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.0.12 on 2026-10-18 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import main.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAd',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=40, verbose_name='Название товара')),
+                ('description', models.TextField(verbose_name='Описание')),
+                ('price', models.FloatField(default=0, verbose_name='Цена')),
+                ('contacts', models.TextField(verbose_name='Контакты')),
+                ('image', models.ImageField(blank=True, db_index=True, storage=main.storage.ContentAddressedStorage(), upload_to='', verbose_name='Изображение')),
+                ('is_active', models.BooleanField(verbose_name='Показывалось?')),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='Дата публикации')),
+                ('updated_at', models.DateTimeField(verbose_name='Изменено')),
+                ('comment_count', models.IntegerField(default=0, verbose_name='Показываемых комментариев')),
+                ('last_comment_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний комментарий')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесено в архив')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('rubric', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='main.SubRubric', verbose_name='Рубрика')),
+            ],
+            options={
+                'verbose_name': 'Архивное объявление',
+                'verbose_name_plural': 'Архивные объявления',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAdditionalImage',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(db_index=True, storage=main.storage.ContentAddressedStorage(), upload_to='', verbose_name='Изображение')),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.ArchivedAd', verbose_name='Объявление')),
+            ],
+            options={
+                'verbose_name': 'Архивное дополнительное изображение',
+                'verbose_name_plural': 'Архивные дополнительные изображения',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.CharField(max_length=30, verbose_name='Автор')),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('is_active', models.BooleanField(verbose_name='Показывать?')),
+                ('created_at', models.DateTimeField(verbose_name='Опубликован')),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.ArchivedAd', verbose_name='Объявление')),
+            ],
+            options={
+                'verbose_name': 'Архивный комментарий',
+                'verbose_name_plural': 'Архивные комментарии',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedcomment',
+            index=models.Index(condition=models.Q(is_active=True), fields=['ad', 'created_at', 'id'], name='main_archcomment_ad_active_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.12 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rubric',
+            name='ad_lifetime_days',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Срок показа объявлений, дней'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Показывать до'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False), ('is_active', True)), fields=['expires_at'], name='main_ad_active_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.12 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_ad_expiry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['author', 'is_active'], name='main_comment_author_idx'),
+        ),
+    ]
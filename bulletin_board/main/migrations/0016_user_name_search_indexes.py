@@ -0,0 +1,41 @@
+# Generated by Django 3.0.12 on 2026-10-18 21:00
+
+from django.db import migrations
+
+
+CREATE_SEARCH_INDEXES_SQL = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS main_user_first_name_upper_like '
+    'ON main_advanceduser (UPPER(first_name::text) text_pattern_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS main_user_last_name_upper_like '
+    'ON main_advanceduser (UPPER(last_name::text) text_pattern_ops)',
+)
+
+DROP_SEARCH_INDEXES_SQL = (
+    'DROP INDEX CONCURRENTLY IF EXISTS main_user_first_name_upper_like',
+    'DROP INDEX CONCURRENTLY IF EXISTS main_user_last_name_upper_like',
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_SEARCH_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_SEARCH_INDEXES_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0015_comment_author_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
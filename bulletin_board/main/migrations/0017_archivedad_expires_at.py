@@ -0,0 +1,18 @@
+# Generated by Django 3.0.12 on 2026-10-18 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_user_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedad',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Показывалось до'),
+        ),
+    ]
@@ -1,9 +1,22 @@
-from django.db import models
-from django.db.models.signals import post_save
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, connections, transaction
+from django.db.models import Q, F, Value, Count, Subquery, OuterRef
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField, SearchQuery, SearchRank
 from django.dispatch import Signal
+from django.utils import timezone
 
-from .utilities import send_activation_notification, get_timestamp_path, send_new_comment_notification
+from .caching import bump_fragment_versions
+from .metrics import count_cache_lookup
+from .storage import content_storage
+from .thumbnails import schedule_thumbnails
+from .utilities import send_activation_notification, get_timestamp_path, send_new_comment_notification, \
+    purge_media_files
 
 
 def user_registered_dispatcher(**kwargs):
@@ -16,6 +29,66 @@ def post_save_dispatcher(**kwargs):
         send_new_comment_notification(kwargs['instance'])
 
 
+def image_saved_dispatcher(**kwargs):
+    instance = kwargs['instance']
+    # Незагруженное поле изображения при сохранении не меняется
+    if 'image' in instance.get_deferred_fields():
+        return
+    name = instance.image.name
+    if kwargs['created'] or name != instance.loaded_image_name:
+        schedule_thumbnails(name)
+    instance.loaded_image_name = name
+
+
+def ad_changed_dispatcher(**kwargs):
+    ad = kwargs['instance']
+    bump_fragment_versions('ad', [ad.pk])
+    bump_fragment_versions('rubric', {ad.rubric_id, ad.counted_state[1]} - {None})
+
+
+def ad_counters_dispatcher(**kwargs):
+    ad = kwargs['instance']
+    old_active, old_rubric_id = (False, None) if kwargs.get('created') else ad.counted_state
+    new_active, new_rubric_id = (ad.is_active, ad.rubric_id) if 'created' in kwargs else (False, None)
+    if old_active is not None:
+        deltas = {}
+        if old_active:
+            deltas[old_rubric_id] = deltas.get(old_rubric_id, 0) - 1
+        if new_active:
+            deltas[new_rubric_id] = deltas.get(new_rubric_id, 0) + 1
+        update_rubric_ad_counts(deltas)
+    ad.counted_state = (ad.is_active, ad.rubric_id)
+
+
+def comment_counters_dispatcher(**kwargs):
+    comment = kwargs['instance']
+    old_active, old_ad_id = (False, None) if kwargs.get('created') else comment.counted_state
+    new_active, new_ad_id = (comment.is_active, comment.ad_id) if 'created' in kwargs else (False, None)
+    if old_active is not None:
+        changed_ad_ids = set()
+        if old_active and (old_ad_id != new_ad_id or not new_active):
+            update_ad_comment_counts(old_ad_id, -1, comment.created_at)
+            changed_ad_ids.add(old_ad_id)
+        if new_active and (old_ad_id != new_ad_id or not old_active):
+            update_ad_comment_counts(new_ad_id, 1, comment.created_at)
+            changed_ad_ids.add(new_ad_id)
+        if changed_ad_ids:
+            # Число комментариев выводится и в кэшированном списке объявлений рубрики
+            bump_fragment_versions('rubric', Ad.objects.filter(pk__in=changed_ad_ids)
+                                   .values_list('rubric_id', flat=True))
+    comment.counted_state = (comment.is_active, comment.ad_id)
+
+
+def ad_content_changed_dispatcher(**kwargs):
+    ad_id = kwargs['instance'].ad_id
+    Ad.objects.filter(pk=ad_id).update(updated_at=timezone.now())
+    bump_fragment_versions('ad', [ad_id])
+
+
+def rubric_changed_dispatcher(**kwargs):
+    cache.delete(RUBRIC_TREE_CACHE_KEY)
+
+
 class AdvancedUser(AbstractUser):
     """Модель пользователя с дополнительными настройками"""
 
@@ -28,9 +101,9 @@ class AdvancedUser(AbstractUser):
 
     def delete(self, *args, **kwargs):
         """Удаление обхявлений связанных с пользователем"""
-        for ad in self.ad_set.all():
-            ad.delete()
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            self.ad_set.all().bulk_delete()
+            return super().delete(*args, **kwargs)
 
     class Meta(AbstractUser.Meta):
         pass
@@ -43,6 +116,9 @@ class Rubric(models.Model):
     order = models.SmallIntegerField(default=0, db_index=True, verbose_name='Порядок')
     super_rubric = models.ForeignKey('SuperRubric', on_delete=models.PROTECT, null=True, blank=True,
                                      verbose_name='Надрубрика')
+    ad_count = models.IntegerField(default=0, editable=False, verbose_name='Показываемых объявлений')
+    ad_lifetime_days = models.PositiveIntegerField(null=True, blank=True,
+                                                   verbose_name='Срок показа объявлений, дней')
 
 
 class SuperRubricManager(models.Manager):
@@ -89,6 +165,98 @@ class SubRubric(Rubric):
         verbose_name_plural = 'Подрубрики'
 
 
+RUBRIC_TREE_CACHE_KEY = 'main:rubric_tree'
+
+# Конфигурация полнотекстового поиска, с которой триггер из миграции 0005 строит search_vector.
+# Менять её можно только вместе с новой миграцией, пересоздающей триггер и пересчитывающей вектор
+SEARCH_CONFIG = 'pg_catalog.russian'
+
+
+def get_rubric_tree():
+    """Дерево рубрик для панели навигации, хранящееся в кэше"""
+    tree = cache.get(RUBRIC_TREE_CACHE_KEY)
+    count_cache_lookup('rubric_tree', tree is not None)
+    if tree is None:
+        tree = []
+        for rubric in SubRubric.objects.select_related('super_rubric'):
+            if not tree or tree[-1]['pk'] != rubric.super_rubric_id:
+                tree.append({'pk': rubric.super_rubric_id, 'name': rubric.super_rubric.name, 'sub_rubrics': []})
+            tree[-1]['sub_rubrics'].append({'pk': rubric.pk, 'name': rubric.name, 'ad_count': rubric.ad_count})
+        cache.set(RUBRIC_TREE_CACHE_KEY, tree, settings.RUBRIC_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+class AdQuerySet(models.QuerySet):
+    """Набор записей модели Ad"""
+
+    def visible(self):
+        """Показываемые объявления с неистёкшим сроком показа"""
+        # Истёкшие объявления скрываются заданием expire_ads, поэтому условие почти не отсекает записи индекса
+        return self.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()), is_active=True)
+
+    def viewable_by(self, user):
+        """Объявления, страницы и комментарии которых доступны пользователю: показываемые и его собственные"""
+        ads = self.visible()
+        if user.is_authenticated:
+            ads = ads | self.filter(author=user.pk)
+        return ads
+
+    def bulk_deactivate(self):
+        """Скрытие объявлений одним запросом с пересчётом счётчиков рубрик, возвращает число скрытых"""
+        with transaction.atomic(using=self.db):
+            rows = list(self.filter(is_active=True).select_for_update().order_by().values_list('pk', 'rubric_id'))
+            ad_ids = [pk for pk, rubric_id in rows]
+            Ad.objects.using(self.db).filter(pk__in=ad_ids).update(is_active=False, updated_at=timezone.now())
+            deltas = {}
+            for pk, rubric_id in rows:
+                deltas[rubric_id] = deltas.get(rubric_id, 0) - 1
+            update_rubric_ad_counts(deltas)
+        bump_fragment_versions('ad', ad_ids)
+        bump_fragment_versions('rubric', {rubric_id for pk, rubric_id in rows})
+        return len(ad_ids)
+
+    def search(self, keyword):
+        """Полнотекстовый поиск с ранжированием по релевантности, на SQLite - поиск по вхождению"""
+        if connections[self.db].vendor != 'postgresql':
+            queryset = self.filter(Q(title__icontains=keyword) | Q(description__icontains=keyword))
+            return queryset.annotate(rank=Value(0, output_field=models.FloatField()))
+        query = SearchQuery(keyword, config=SEARCH_CONFIG)
+        # Ранг округляется, чтобы его можно было точно передать в курсоре постраничного вывода
+        rank = Cast(SearchRank(F('search_vector'), query), models.DecimalField(max_digits=12, decimal_places=6))
+        return self.filter(search_vector=query).annotate(rank=rank).order_by('-rank', '-created_at', '-pk')
+
+    def bulk_delete(self):
+        """Удаление объявлений вместе с дополнительными изображениями и комментариями, возвращает число удалённых"""
+        return self.delete_with_related()[1][Ad._meta.label]
+
+    def delete_with_related(self):
+        """Удаление объявлений со связанными записями без загрузки, результат в формате QuerySet.delete()"""
+        rows = list(self.order_by().values_list('pk', 'rubric_id', 'is_active'))
+        ad_ids = [pk for pk, rubric_id, is_active in rows]
+        deltas = {}
+        for pk, rubric_id, is_active in rows:
+            if is_active:
+                deltas[rubric_id] = deltas.get(rubric_id, 0) - 1
+        file_names = []
+        deleted = {Comment._meta.label: 0, AdditionalImage._meta.label: 0, Ad._meta.label: 0}
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(ad_ids), settings.BULK_DELETE_CHUNK_SIZE):
+                chunk = ad_ids[start:start + settings.BULK_DELETE_CHUNK_SIZE]
+                ads = Ad.objects.using(self.db).filter(pk__in=chunk)
+                images = AdditionalImage.objects.using(self.db).filter(ad__in=chunk)
+                file_names.extend(ads.exclude(image='').values_list('image', flat=True))
+                file_names.extend(images.values_list('image', flat=True))
+                deleted[Comment._meta.label] += Comment.objects.using(self.db).filter(ad__in=chunk)._raw_delete(self.db)
+                deleted[AdditionalImage._meta.label] += images._raw_delete(self.db)
+                deleted[Ad._meta.label] += ads._raw_delete(self.db)
+            update_rubric_ad_counts(deltas)
+            # Файлы удаляются только после успешной фиксации транзакции
+            transaction.on_commit(lambda: purge_media_files(file_names), using=self.db)
+        bump_fragment_versions('ad', ad_ids)
+        bump_fragment_versions('rubric', {rubric_id for pk, rubric_id, is_active in rows})
+        return sum(deleted.values()), deleted
+
+
 class Ad(models.Model):
     """Модель объявлений"""
 
@@ -97,33 +265,106 @@ class Ad(models.Model):
     description = models.TextField(verbose_name='Описание')
     price = models.FloatField(default=0, verbose_name='Цена')
     contacts = models.TextField(verbose_name='Контакты')
-    image = models.ImageField(blank=True, upload_to=get_timestamp_path, verbose_name='Изображение')
+    image = models.ImageField(blank=True, upload_to=get_timestamp_path, storage=content_storage, db_index=True,
+                              verbose_name='Изображение')
     author = models.ForeignKey(AdvancedUser, on_delete=models.CASCADE, verbose_name='Пользователь')
     is_active = models.BooleanField(default=True, verbose_name='Показывать?')
     created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата публикации')
-
-    def delete(self, *args, **kwargs):
-        for image in self.additionalimage_set.all():
-            image.delete()
-        super().delete(*args, **kwargs)
+    # Меняется также при изменении дополнительных изображений и комментариев
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменено')
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Показывать до')
+    # Заполняется триггером PostgreSQL из названия и описания
+    search_vector = SearchVectorField(null=True, editable=False)
+    comment_count = models.IntegerField(default=0, editable=False, verbose_name='Показываемых комментариев')
+    last_comment_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Последний комментарий')
+
+    objects = AdQuerySet.as_manager()
+
+    # Состояние неизвестно для объектов, созданных не из базы
+    counted_state = (None, None)
+    loaded_image_name = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминание состояния, учтённого в счётчике объявлений рубрики, и сохранённого изображения"""
+        instance = super().from_db(db, field_names, values)
+        instance.counted_state = (instance.__dict__.get('is_active'), instance.__dict__.get('rubric_id'))
+        instance.loaded_image_name = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Назначение срока показа по умолчанию для рубрики"""
+        if self._state.adding and self.expires_at is None:
+            self.expires_at = get_default_expiry(self.rubric)
+        super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        """Удаление объявления вместе с дополнительными изображениями и комментариями"""
+        return Ad.objects.using(using or self._state.db).filter(pk=self.pk).delete_with_related()
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Объявление'
         verbose_name_plural = 'Объявлениия'
+        indexes = [
+            models.Index(fields=['rubric', '-created_at', '-id'], name='main_ad_rubric_active_idx',
+                         condition=Q(is_active=True)),
+            models.Index(fields=['-created_at', '-id'], name='main_ad_active_created_idx',
+                         condition=Q(is_active=True)),
+            models.Index(fields=['expires_at'], name='main_ad_active_expires_idx',
+                         condition=Q(is_active=True, expires_at__isnull=False)),
+        ]
 
 
 class AdditionalImage(models.Model):
     """Модель дополнительных изображений"""
 
     ad = models.ForeignKey(Ad, on_delete=models.CASCADE, verbose_name='Объявление')
-    image = models.ImageField(upload_to=get_timestamp_path, verbose_name='Изображение')
+    image = models.ImageField(upload_to=get_timestamp_path, storage=content_storage, db_index=True,
+                              verbose_name='Изображение')
+
+    loaded_image_name = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминание сохранённого изображения, миниатюры которого уже заказаны"""
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_image_name = instance.__dict__.get('image')
+        return instance
 
     class Meta:
         verbose_name = 'Дополнительное изображение'
         verbose_name_plural = 'Дополнительные изображения'
 
 
+# Автор комментариев, оставленных без входа на сайт
+GUEST_AUTHOR = 'Гость'
+
+
+class CommentQuerySet(models.QuerySet):
+    """Набор записей модели Comment"""
+
+    def _affected_ad_ids(self, queryset):
+        return list(queryset.select_related(None).order_by().values_list('ad_id', flat=True).distinct())
+
+    def set_active(self, is_active):
+        """Показ или скрытие комментариев одним запросом UPDATE, возвращает число изменённых"""
+        with transaction.atomic(using=self.db):
+            changed = self.filter(is_active=not is_active)
+            ad_ids = self._affected_ad_ids(changed)
+            count = changed.select_related(None).order_by().update(is_active=is_active)
+            refresh_comment_aggregates(ad_ids)
+        return count
+
+    def bulk_delete(self):
+        """Удаление комментариев одним запросом DELETE без загрузки записей, возвращает число удалённых"""
+        with transaction.atomic(using=self.db):
+            ad_ids = self._affected_ad_ids(self.filter(is_active=True))
+            count = self.select_related(None).order_by()._raw_delete(self.db)
+            refresh_comment_aggregates(ad_ids)
+        return count
+
+
 class Comment(models.Model):
     """Модель комментариев к объявлениям"""
 
@@ -133,6 +374,17 @@ class Comment(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='Показывать?')
     created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Опубликован')
 
+    objects = CommentQuerySet.as_manager()
+
+    counted_state = (None, None)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминание состояния, учтённого в счётчике комментариев объявления"""
+        instance = super().from_db(db, field_names, values)
+        instance.counted_state = (instance.__dict__.get('is_active'), instance.__dict__.get('ad_id'))
+        return instance
+
     def __str__(self):
         return f'Комментарий от {self.author}'
 
@@ -140,8 +392,250 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['ad', 'created_at', 'id'], name='main_comment_ad_active_idx',
+                         condition=Q(is_active=True)),
+            models.Index(fields=['author', 'is_active'], name='main_comment_author_idx'),
+        ]
+
+
+def get_default_expiry(rubric, start=None):
+    """Окончание срока показа объявления по сроку рубрики или None для бессрочных рубрик"""
+    if not rubric.ad_lifetime_days:
+        return None
+    return (start or timezone.now()) + datetime.timedelta(days=rubric.ad_lifetime_days)
+
+
+def update_rubric_ad_counts(deltas):
+    """Изменение счётчиков объявлений рубрик на заданные величины"""
+    deltas = {rubric_id: delta for rubric_id, delta in deltas.items() if rubric_id and delta}
+    for rubric_id, delta in deltas.items():
+        Rubric.objects.filter(pk=rubric_id).update(ad_count=F('ad_count') + delta)
+    if deltas:
+        cache.delete(RUBRIC_TREE_CACHE_KEY)
+
+
+def update_ad_comment_counts(ad_id, delta, created_at):
+    """Изменение счётчика комментариев объявления и времени последнего комментария"""
+    if delta > 0:
+        created_at = Value(created_at, output_field=models.DateTimeField())
+        last_comment_at = Greatest(Coalesce('last_comment_at', created_at), created_at)
+    else:
+        last_comment_at = Subquery(Comment.objects.filter(ad=OuterRef('pk'), is_active=True)
+                                   .order_by('-created_at').values('created_at')[:1])
+    Ad.objects.filter(pk=ad_id).update(comment_count=F('comment_count') + delta, last_comment_at=last_comment_at)
+
+
+def recount_rubric_ad_counts(rubrics=None):
+    """Пересчёт счётчиков объявлений рубрик, возвращает число исправленных записей"""
+    rubrics = Rubric.objects.all() if rubrics is None else rubrics
+    actual = Ad.objects.filter(rubric=OuterRef('pk'), is_active=True).order_by()
+    actual = Coalesce(Subquery(actual.values('rubric').annotate(count=Count('pk')).values('count')), 0)
+    drifted = rubrics.annotate(actual=actual).exclude(ad_count=F('actual'))
+    fixed = Rubric.objects.filter(pk__in=drifted.values('pk')).update(ad_count=actual)
+    if fixed:
+        cache.delete(RUBRIC_TREE_CACHE_KEY)
+    return fixed
+
+
+def recount_ad_comment_counts(ads=None):
+    """Пересчёт счётчиков комментариев объявлений, возвращает число исправленных записей"""
+    ads = Ad.objects.all() if ads is None else ads
+    comments = Comment.objects.filter(ad=OuterRef('pk'), is_active=True).order_by()
+    actual_count = Coalesce(Subquery(comments.values('ad').annotate(count=Count('pk')).values('count')), 0)
+    actual_last = Subquery(comments.order_by('-created_at').values('created_at')[:1])
+    drifted = ads.annotate(actual_count=actual_count, actual_last=actual_last).filter(
+        ~Q(comment_count=F('actual_count')) |
+        Q(last_comment_at__isnull=True, actual_last__isnull=False) |
+        Q(last_comment_at__isnull=False, actual_last__isnull=True) |
+        ~Q(last_comment_at=F('actual_last'))
+    )
+    return Ad.objects.filter(pk__in=drifted.values('pk')).update(comment_count=actual_count,
+                                                                 last_comment_at=actual_last)
+
+
+def refresh_comment_aggregates(ad_ids):
+    """Пересчёт счётчиков комментариев и сброс кэшей объявлений и их рубрик после массовых изменений комментариев"""
+    ad_ids = sorted(ad_ids)
+    rubric_ids = set()
+    now = timezone.now()
+    for start in range(0, len(ad_ids), settings.BULK_DELETE_CHUNK_SIZE):
+        ads = Ad.objects.filter(pk__in=ad_ids[start:start + settings.BULK_DELETE_CHUNK_SIZE])
+        recount_ad_comment_counts(ads)
+        ads.update(updated_at=now)
+        rubric_ids.update(ads.values_list('rubric_id', flat=True))
+    bump_fragment_versions('ad', ad_ids)
+    bump_fragment_versions('rubric', rubric_ids)
+
+
+class OutgoingMail(models.Model):
+    """Модель писем в очереди отправки"""
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (SENT, 'Отправлено'),
+        (DEAD, 'Не доставлено'),
+    )
+
+    recipient = models.EmailField(verbose_name='Получатель')
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Поставлено в очередь')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено')
+
+    def __str__(self):
+        return f'Письмо для {self.recipient}'
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='main_mail_status_next_idx'),
+        ]
+
+
+class ArchivedAd(models.Model):
+    """Модель архивных объявлений, перенесённых из основной таблицы с сохранением ключей"""
+
+    id = models.IntegerField(primary_key=True, verbose_name='ID')
+    rubric = models.ForeignKey(SubRubric, on_delete=models.PROTECT, verbose_name='Рубрика')
+    title = models.CharField(max_length=40, verbose_name='Название товара')
+    description = models.TextField(verbose_name='Описание')
+    price = models.FloatField(default=0, verbose_name='Цена')
+    contacts = models.TextField(verbose_name='Контакты')
+    image = models.ImageField(blank=True, storage=content_storage, db_index=True, verbose_name='Изображение')
+    author = models.ForeignKey(AdvancedUser, on_delete=models.CASCADE, verbose_name='Пользователь')
+    is_active = models.BooleanField(verbose_name='Показывалось?')
+    created_at = models.DateTimeField(db_index=True, verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(verbose_name='Изменено')
+    comment_count = models.IntegerField(default=0, verbose_name='Показываемых комментариев')
+    last_comment_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний комментарий')
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Показывалось до')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Перенесено в архив')
+
+    class Meta:
+        verbose_name = 'Архивное объявление'
+        verbose_name_plural = 'Архивные объявления'
+        ordering = ['-created_at']
+
+
+class ArchivedAdditionalImage(models.Model):
+    """Модель дополнительных изображений архивных объявлений"""
+
+    id = models.IntegerField(primary_key=True, verbose_name='ID')
+    ad = models.ForeignKey(ArchivedAd, on_delete=models.CASCADE, verbose_name='Объявление')
+    image = models.ImageField(storage=content_storage, db_index=True, verbose_name='Изображение')
+
+    class Meta:
+        verbose_name = 'Архивное дополнительное изображение'
+        verbose_name_plural = 'Архивные дополнительные изображения'
+
+
+class ArchivedComment(models.Model):
+    """Модель комментариев к архивным объявлениям"""
+
+    id = models.IntegerField(primary_key=True, verbose_name='ID')
+    ad = models.ForeignKey(ArchivedAd, on_delete=models.CASCADE, verbose_name='Объявление')
+    author = models.CharField(max_length=30, verbose_name='Автор')
+    text = models.TextField(verbose_name='Текст')
+    is_active = models.BooleanField(verbose_name='Показывать?')
+    created_at = models.DateTimeField(verbose_name='Опубликован')
+
+    def __str__(self):
+        return f'Комментарий от {self.author}'
+
+    class Meta:
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['ad', 'created_at', 'id'], name='main_archcomment_ad_active_idx',
+                         condition=Q(is_active=True)),
+        ]
+
+
+def archive_ads(pks):
+    """Перенос объявлений с изображениями и комментариями в архивные таблицы, возвращает число перенесённых"""
+    with transaction.atomic():
+        ads = list(Ad.objects.select_for_update().filter(pk__in=pks).order_by().values(
+            'pk', 'rubric_id', 'title', 'description', 'price', 'contacts', 'image', 'author_id', 'is_active',
+            'created_at', 'updated_at', 'comment_count', 'last_comment_at', 'expires_at'
+        ))
+        if not ads:
+            return 0
+        pks = [ad.pop('pk') for ad in ads]
+        ArchivedAd.objects.bulk_create(ArchivedAd(id=pk, **ad) for pk, ad in zip(pks, ads))
+        images = AdditionalImage.objects.filter(ad__in=pks)
+        ArchivedAdditionalImage.objects.bulk_create(
+            ArchivedAdditionalImage(id=pk, ad_id=ad_id, image=image)
+            for pk, ad_id, image in images.values_list('pk', 'ad_id', 'image')
+        )
+        comments = Comment.objects.filter(ad__in=pks)
+        ArchivedComment.objects.bulk_create(
+            ArchivedComment(**comment)
+            for comment in comments.values('id', 'ad_id', 'author', 'text', 'is_active', 'created_at').iterator()
+        )
+        comments._raw_delete(comments.db)
+        images._raw_delete(images.db)
+        Ad.objects.filter(pk__in=pks)._raw_delete(Ad.objects.db)
+        deltas = {}
+        for ad in ads:
+            if ad['is_active']:
+                deltas[ad['rubric_id']] = deltas.get(ad['rubric_id'], 0) - 1
+        update_rubric_ad_counts(deltas)
+    bump_fragment_versions('ad', pks)
+    bump_fragment_versions('rubric', {ad['rubric_id'] for ad in ads})
+    return len(pks)
+
+
+class SlowRequest(models.Model):
+    """Модель медленных и профилированных запросов"""
+
+    path = models.CharField(max_length=255, verbose_name='Адрес')
+    view_name = models.CharField(max_length=100, blank=True, db_index=True, verbose_name='Маршрут')
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Код ответа')
+    duration = models.FloatField(verbose_name='Всего, мс')
+    db_time = models.FloatField(verbose_name='База данных, мс')
+    template_time = models.FloatField(verbose_name='Шаблоны, мс')
+    thumbnail_time = models.FloatField(verbose_name='Миниатюры, мс')
+    context_processor_time = models.FloatField(verbose_name='Обработчики контекста, мс')
+    view_time = models.FloatField(verbose_name='Представление, мс')
+    queries = models.PositiveIntegerField(verbose_name='Запросов к базе')
+    profile = models.CharField(max_length=255, blank=True, verbose_name='Файл профиля')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Выполнен')
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ['-duration']
 
 
 user_registered = Signal(providing_args=['instance'])
 user_registered.connect(user_registered_dispatcher)
 post_save.connect(post_save_dispatcher, sender=Comment)
+post_save.connect(image_saved_dispatcher, sender=Ad)
+post_save.connect(image_saved_dispatcher, sender=AdditionalImage)
+post_save.connect(ad_changed_dispatcher, sender=Ad)
+post_delete.connect(ad_changed_dispatcher, sender=Ad)
+post_save.connect(ad_counters_dispatcher, sender=Ad)
+post_delete.connect(ad_counters_dispatcher, sender=Ad)
+post_save.connect(comment_counters_dispatcher, sender=Comment)
+post_delete.connect(comment_counters_dispatcher, sender=Comment)
+for ad_content_model in (AdditionalImage, Comment):
+    post_save.connect(ad_content_changed_dispatcher, sender=ad_content_model)
+    post_delete.connect(ad_content_changed_dispatcher, sender=ad_content_model)
+for rubric_model in (Rubric, SuperRubric, SubRubric):
+    post_save.connect(rubric_changed_dispatcher, sender=rubric_model)
+    post_delete.connect(rubric_changed_dispatcher, sender=rubric_model)
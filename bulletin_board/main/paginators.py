@@ -0,0 +1,181 @@
+import json
+import re
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+
+class InvalidCursor(Exception):
+    """Повреждённый или подделанный курсор"""
+    pass
+
+
+def estimate_count(queryset):
+    """Оценка числа записей по плану запроса PostgreSQL без выполнения COUNT(*)"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        plan = cursor.fetchone()[0]
+    match = re.search(r'rows=(\d+)', plan)
+    return int(match.group(1)) if match else None
+
+
+def estimate_table_count(model, using):
+    """Оценка числа записей таблицы по статистике PostgreSQL или None"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                       [connection.ops.quote_name(model._meta.db_table)])
+        row = cursor.fetchone()
+    # До первого ANALYZE статистика отсутствует
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Постраничный вывод больших таблиц с оценкой числа записей вместо точного COUNT(*)"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and connections[queryset.db].vendor == 'postgresql':
+            if queryset.query.where:
+                estimate = estimate_count(queryset)
+            else:
+                estimate = estimate_table_count(queryset.model, queryset.db)
+            # Небольшие выборки считаются точно
+            if estimate is not None and estimate > settings.ADMIN_EXACT_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class CursorPage:
+    """Страница объявлений, полученная по курсору"""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу сортировки без COUNT(*) и OFFSET"""
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-pk'), estimate_total=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.estimate_total = estimate_total
+
+    @property
+    def total(self):
+        """Приблизительное общее число записей, если оно запрошено"""
+        if not self.estimate_total:
+            return None
+        if not hasattr(self, '_total'):
+            self._total = estimate_count(self.queryset)
+        return self._total
+
+    def _field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _position(self, obj):
+        return [getattr(obj, name) for name in self._field_names()]
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for value in self._position(obj):
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        data = json.dumps([direction, values], separators=(',', ':'))
+        return urlsafe_base64_encode(data.encode())
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = json.loads(force_str(urlsafe_base64_decode(cursor)))
+            if direction not in ('n', 'p') or len(values) != len(self.ordering):
+                raise ValueError
+            opts = self.queryset.model._meta
+            position = []
+            for name, value in zip(self._field_names(), values):
+                if name == 'pk':
+                    field = opts.pk
+                elif name in self.queryset.query.annotations:
+                    # Аннотированные значения, например ранг поиска
+                    field = self.queryset.query.annotations[name].output_field
+                else:
+                    field = opts.get_field(name)
+                position.append(field.to_python(value))
+        except Exception:
+            raise InvalidCursor(cursor)
+        return direction, position
+
+    def _seek(self, ordering, position):
+        """Условие «после позиции» для заданного порядка сортировки"""
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, position):
+            field = name.lstrip('-')
+            lookup = '__lt' if name.startswith('-') else '__gt'
+            condition |= Q(**equal, **{field + lookup: value})
+            equal[field] = value
+        return condition
+
+    def get_page(self, cursor=None):
+        """Страница, следующая за курсором или предшествующая ему"""
+        direction, position = 'n', None
+        if cursor:
+            try:
+                direction, position = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, position = 'n', None
+        ordering = self.ordering
+        if direction == 'p':
+            ordering = tuple(name[1:] if name.startswith('-') else '-' + name for name in ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == 'p':
+            object_list.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        next_cursor = previous_cursor = None
+        if object_list:
+            if has_next:
+                next_cursor = self.encode_cursor(object_list[-1], 'n')
+            if has_previous:
+                previous_cursor = self.encode_cursor(object_list[0], 'p')
+        return CursorPage(object_list, self, next_cursor, previous_cursor)
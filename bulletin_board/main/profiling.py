@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+
+# Порядок категорий в заголовке Server-Timing
+CATEGORIES = ('db', 'template', 'thumbnail', 'context-processor', 'view')
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """Время обработки запроса по категориям без учёта вложенных замеров"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.queries = 0
+        # Время вложенных замеров для каждого открытого замера
+        self._children = []
+
+    def breakdown(self):
+        """Длительности в миллисекундах, время представления - остаток от общего времени"""
+        total = time.perf_counter() - self.start
+        result = {category: self.durations[category] * 1000 for category in CATEGORIES if category != 'view'}
+        result['view'] = max(total * 1000 - sum(result.values()), 0)
+        result['total'] = total * 1000
+        return result
+
+
+def start_timings():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def stop_timings():
+    _local.timings = None
+
+
+@contextmanager
+def timed(category):
+    """Замер времени блока в категории текущего запроса"""
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    timings._children.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings.durations[category] += elapsed - timings._children.pop()
+        if timings._children:
+            timings._children[-1] += elapsed
+
+
+def timed_function(category):
+    """Декоратор, замеряющий время вызовов функции"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def time_query(execute, sql, params, many, context):
+    """Обёртка выполнения SQL-запросов для подключений к базам данных"""
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.queries += 1
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+class TimedTemplate:
+    """Шаблон, время отрисовки которого учитывается в категории template"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """Стандартный шаблонизатор Django с замером времени отрисовки"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,89 @@
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+
+_state = threading.local()
+# Реплики, к которым не удалось подключиться, и время следующей попытки
+_failed_replicas = {}
+
+
+def reset_state(pinned=False):
+    """Сброс состояния маршрутизации в начале и в конце запроса"""
+    _state.pinned = pinned
+    _state.written = False
+    _state.replica = None
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def has_written():
+    return getattr(_state, 'written', False)
+
+
+def get_current_replica():
+    """Реплика, выбранная для чтения в текущем запросе, или None"""
+    return getattr(_state, 'replica', None)
+
+
+def mark_replica_failed(alias):
+    """Исключение реплики из выбора до следующей попытки подключения"""
+    _failed_replicas[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def fall_back_to_primary():
+    """Переключение текущего запроса на основную базу после ошибки при чтении с реплики"""
+    replica = get_current_replica()
+    # Ошибка могла возникнуть и на основной базе, поэтому реплика исключается, только если она недоступна
+    if replica is not None and not connections[replica].is_usable():
+        mark_replica_failed(replica)
+    reset_state(pinned=True)
+
+
+def get_replica():
+    """Доступная реплика, выбранная один раз на запрос, или None"""
+    replica = getattr(_state, 'replica', None)
+    if replica in settings.DATABASE_REPLICAS:
+        return replica
+    now = time.monotonic()
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if _failed_replicas.get(alias, 0) <= now]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as error:
+            logger.warning('Реплика %s недоступна, чтение переключено на основную базу: %s', alias, error)
+            mark_replica_failed(alias)
+        else:
+            _failed_replicas.pop(alias, None)
+            _state.replica = alias
+            return alias
+    return None
+
+
+class PrimaryReplicaRouter:
+    """Чтение с реплик, запись и чтение после записи - с основной базы"""
+
+    def db_for_read(self, model, **hints):
+        if is_pinned() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return get_replica() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        _state.pinned = _state.written = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,17 @@
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBSessionStore
+
+
+class SessionStore(CachedDBSessionStore):
+    """Сессии читаются из кэша с копией в базе данных на случай вытеснения, неизменённые сессии не записываются"""
+
+    def load(self):
+        data = super().load()
+        self._saved_data = self.serializer().dumps(data)
+        return data
+
+    def save(self, must_create=False):
+        data = self.serializer().dumps(self._get_session(no_load=must_create))
+        if not must_create and self.session_key and data == getattr(self, '_saved_data', None):
+            return
+        super().save(must_create=must_create)
+        self._saved_data = data
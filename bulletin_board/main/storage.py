@@ -0,0 +1,62 @@
+import hashlib
+from os.path import splitext
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Модели, поля image которых ссылаются на файлы хранилища
+REFERENCING_MODELS = ('main.Ad', 'main.AdditionalImage', 'main.ArchivedAd', 'main.ArchivedAdditionalImage')
+
+
+def get_referenced_names(names):
+    """Имена файлов, на которые ещё ссылаются записи базы данных"""
+    names = list(names)
+    referenced = set()
+    for label in REFERENCING_MODELS:
+        model = apps.get_model(label)
+        referenced.update(model.objects.filter(image__in=names).values_list('image', flat=True))
+    return referenced
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, размещающее файлы по хэшу содержимого в подкаталогах вида ab/cd/"""
+
+    def get_content_name(self, name, content):
+        """Имя файла по хэшу SHA-256 содержимого, вычисляемому при чтении по частям"""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        content_hash = digest.hexdigest()
+        return f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{splitext(name)[1].lower()}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Такой файл уже загружен, повторно копия не сохраняется
+            return name
+        return super().save(name, content, max_length)
+
+    def delete(self, name):
+        """Удаление файла только после исчезновения последней ссылки на него"""
+        if name and name in get_referenced_names([name]):
+            return
+        super().delete(name)
+
+    def delete_unreferenced(self, names):
+        """Удаление файлов, на которые больше не ссылается ни одна запись"""
+        names = set(filter(None, names))
+        deleted = sorted(names - get_referenced_names(names))
+        for name in deleted:
+            super().delete(name)
+        return deleted
+
+
+content_storage = ContentAddressedStorage()
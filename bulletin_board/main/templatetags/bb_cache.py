@@ -0,0 +1,36 @@
+from django import template
+
+from main.caching import make_fragment_key, get_cached_fragment
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, kind, pk, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.kind = kind
+        self.pk = pk
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_fragment_key(self.fragment_name, self.kind.resolve(context), self.pk.resolve(context), vary_on)
+        return get_cached_fragment(key, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def versioned_cache(parser, token):
+    """
+    Кэширование фрагмента до смены версии объявления или рубрики:
+    {% versioned_cache 'ad_card' 'ad' ad.pk [vary_on ...] %} ... {% endversioned_cache %}
+    """
+    nodelist = parser.parse(('endversioned_cache', ))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 4:
+        raise template.TemplateSyntaxError(f'{tokens[0]} принимает не менее трёх аргументов')
+    fragment_name = tokens[1].strip('\'"')
+    kind, pk = parser.compile_filter(tokens[2]), parser.compile_filter(tokens[3])
+    vary_on = [parser.compile_filter(bit) for bit in tokens[4:]]
+    return VersionedCacheNode(nodelist, fragment_name, kind, pk, vary_on)
@@ -0,0 +1,11 @@
+from django import template
+
+from main.thumbnails import get_thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(image, alias):
+    """Миниатюра изображения без её создания при выводе страницы"""
+    return get_thumbnail_url(image, alias)
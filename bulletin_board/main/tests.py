@@ -1,3 +1,545 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.models import LogEntry
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command, CommandError
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, connections, OperationalError
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.urls import reverse, ResolverMatch
+from django.utils import timezone
+from prometheus_client.parser import text_string_to_metric_families
+
+from . import routers
+from .admin import CommentAdmin, hide_author_comments, delete_comments
+from .instrumentation import query_budget, get_query_budget
+from .middlewares import ReplicaStickinessMiddleware
+from .paginators import EstimatedCountPaginator
+from .sessions import SessionStore
+from .models import AdvancedUser, OutgoingMail, SlowRequest, SuperRubric, SubRubric, Ad, Comment, \
+    ArchivedAd, ArchivedComment, GUEST_AUTHOR, archive_ads, recount_rubric_ad_counts, recount_ad_comment_counts
+from .utilities import send_activation_notification, send_queued_mail
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutgoingMailTestCase(TestCase):
+    """Очередь исходящей почты"""
+
+    def setUp(self):
+        self.user = AdvancedUser.objects.create_user('tester', 'tester@example.com', 'password')
+
+    def test_notification_is_queued_and_sent(self):
+        send_activation_notification(self.user)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['tester@example.com'])
+        self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.SENT)
+
+    @override_settings(MAIL_QUEUE_MAX_ATTEMPTS=2)
+    def test_failed_mail_is_retried_and_dead_lettered(self):
+        send_activation_notification(self.user)
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=SMTPException):
+            self.assertEqual(send_queued_mail(), (0, 1))
+            queued = OutgoingMail.objects.get()
+            self.assertEqual(queued.status, OutgoingMail.PENDING)
+            self.assertEqual(queued.attempts, 1)
+            OutgoingMail.objects.update(next_attempt_at=queued.created_at)
+            self.assertEqual(send_queued_mail(), (0, 1))
+        self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.DEAD)
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+
+class CounterTestCase(TestCase):
+    """Денормализованные счётчики объявлений и комментариев"""
+
+    def setUp(self):
+        self.author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        self.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        self.ad = Ad.objects.create(rubric=self.rubric, author=self.author, title='Велосипед',
+                                    description='Описание', contacts='Контакты')
+
+    def test_ad_count(self):
+        self.rubric.refresh_from_db()
+        self.assertEqual(self.rubric.ad_count, 1)
+        ad = Ad.objects.get(pk=self.ad.pk)
+        ad.is_active = False
+        ad.save()
+        self.rubric.refresh_from_db()
+        self.assertEqual(self.rubric.ad_count, 0)
+        ad.is_active = True
+        ad.save()
+        self.assertEqual(ad.delete(), (1, {'main.Comment': 0, 'main.AdditionalImage': 0, 'main.Ad': 1}))
+        self.rubric.refresh_from_db()
+        self.assertEqual(self.rubric.ad_count, 0)
+
+    def test_comment_count(self):
+        first = Comment.objects.create(ad=self.ad, author='Гость', text='Первый')
+        second = Comment.objects.create(ad=self.ad, author='Гость', text='Второй')
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.comment_count, self.ad.last_comment_at), (2, second.created_at))
+        Comment.objects.get(pk=second.pk).delete()
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.comment_count, self.ad.last_comment_at), (1, first.created_at))
+
+    def test_recount_repairs_drift(self):
+        Comment.objects.create(ad=self.ad, author='Гость', text='Комментарий')
+        Ad.objects.update(comment_count=5, last_comment_at=None)
+        SubRubric.objects.update(ad_count=3)
+        self.assertEqual(recount_rubric_ad_counts(), 1)
+        self.assertEqual(recount_ad_comment_counts(), 1)
+        self.assertEqual(recount_ad_comment_counts(), 0)
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.comment_count, 1)
+
+
+class ThumbnailSchedulingTestCase(TestCase):
+    """Создание миниатюр только для новых изображений"""
+
+    def setUp(self):
+        author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        self.ad = Ad.objects.create(rubric=rubric, author=author, title='Велосипед',
+                                    description='Описание', contacts='Контакты', image='first.jpg')
+
+    @mock.patch('main.models.schedule_thumbnails')
+    def test_scheduled_on_image_change_only(self, schedule_thumbnails):
+        ad = Ad.objects.get(pk=self.ad.pk)
+        ad.is_active = False
+        ad.save()
+        schedule_thumbnails.assert_not_called()
+        ad.image = 'second.jpg'
+        ad.save()
+        schedule_thumbnails.assert_called_once_with('second.jpg')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_RETRY_SECONDS=30)
+class ReplicaRouterTestCase(TestCase):
+    """Маршрутизация чтения на реплики"""
+
+    def setUp(self):
+        routers.reset_state()
+        routers._failed_replicas.clear()
+        self.router = routers.PrimaryReplicaRouter()
+        patcher = mock.patch.object(routers, 'connections')
+        self.connections = patcher.start()
+        self.connections['default'].in_atomic_block = False
+        self.addCleanup(patcher.stop)
+        self.addCleanup(routers.reset_state)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Ad), 'replica')
+        self.assertEqual(self.router.db_for_write(Ad), 'default')
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.router.db_for_write(Comment)
+        self.assertEqual(self.router.db_for_read(Ad), 'default')
+
+    def test_failed_replica_falls_back_to_primary(self):
+        self.connections['replica'].ensure_connection.side_effect = OperationalError
+        self.assertEqual(self.router.db_for_read(Ad), 'default')
+        self.connections['replica'].ensure_connection.side_effect = None
+        self.assertEqual(self.router.db_for_read(Ad), 'default')
+        self.assertEqual(self.connections['replica'].ensure_connection.call_count, 1)
+
+    def test_middleware_sets_sticky_cookie_after_write(self):
+        def write(request):
+            self.router.db_for_write(Comment)
+            return HttpResponse()
+
+        request = RequestFactory().post('/')
+        response = ReplicaStickinessMiddleware(write)(request)
+        self.assertIn('bb_primary', response.cookies)
+        response = ReplicaStickinessMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertNotIn('bb_primary', response.cookies)
+        self.assertFalse(routers.is_pinned())
+
+    def test_failed_read_retried_on_primary(self):
+        def read(request):
+            return HttpResponse(self.router.db_for_read(Ad))
+
+        self.router.db_for_read(Ad)
+        self.connections['replica'].is_usable.return_value = False
+        request = RequestFactory().get('/')
+        request.resolver_match = ResolverMatch(read, (), {})
+        middleware = ReplicaStickinessMiddleware(read)
+        response = middleware.process_exception(request, OperationalError('server closed the connection'))
+        self.assertEqual(response.content, b'default')
+        self.assertIn('replica', routers._failed_replicas)
+
+
+@skipUnless('replica' in settings.DATABASES, 'Нужна реплика-зеркало, см. BB_TEST_REPLICA в settings.py')
+class ReplicaDatabaseTestCase(TransactionTestCase):
+    """Маршрутизация чтения на настоящем втором подключении"""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        SuperRubric.objects.create(name='Транспорт')
+        routers.reset_state()
+        routers._failed_replicas.clear()
+        self.addCleanup(routers.reset_state)
+
+    def test_reads_use_replica_connection(self):
+        rubrics = SuperRubric.objects.all()
+        self.assertEqual(rubrics.db, 'replica')
+        self.assertEqual([rubric.name for rubric in rubrics], ['Транспорт'])
+
+    def test_failed_read_retried_on_primary(self):
+        def read(request):
+            return HttpResponse(','.join(SuperRubric.objects.values_list('name', flat=True)))
+
+        def fail(execute, sql, params, many, context):
+            raise OperationalError('server closed the connection unexpectedly')
+
+        request = RequestFactory().get('/')
+        request.resolver_match = ResolverMatch(read, (), {})
+        with connections['replica'].execute_wrapper(fail):
+            with self.assertRaises(OperationalError) as error:
+                read(request)
+            response = ReplicaStickinessMiddleware(read).process_exception(request, error.exception)
+        self.assertEqual(response.content.decode(), 'Транспорт')
+        self.assertTrue(routers.is_pinned())
+
+
+class ApiTestCase(TestCase):
+    """JSON API объявлений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        cls.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        cls.ad = Ad.objects.create(rubric=cls.rubric, author=author, title='Велосипед',
+                                   description='Описание', contacts='Контакты')
+
+    def test_fields_selection(self):
+        response = self.client.get(reverse('main:api_rubric_ads', kwargs={'pk': self.rubric.pk}),
+                                   {'fields': 'id,title'})
+        self.assertEqual(response.json()['results'], [{'id': self.ad.pk, 'title': 'Велосипед'}])
+
+    def test_not_modified(self):
+        url = reverse('main:api_ad_detail', kwargs={'pk': self.ad.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_comments_of_hidden_ad_not_found(self):
+        Ad.objects.filter(pk=self.ad.pk).update(is_active=False)
+        response = self.client.get(reverse('main:api_ad_comments', kwargs={'pk': self.ad.pk}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalPageTestCase(TestCase):
+    """Условная обработка запросов страниц объявлений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        cls.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        cls.ad = Ad.objects.create(rubric=cls.rubric, author=author, title='Велосипед',
+                                   description='Описание', contacts='Контакты')
+
+    def test_by_rubric_not_modified(self):
+        url = reverse('main:by_rubric', kwargs={'pk': self.rubric.pk})
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_expiry_changes_by_rubric(self):
+        Ad.objects.filter(pk=self.ad.pk).update(expires_at=timezone.now() + datetime.timedelta(days=1))
+        url = reverse('main:by_rubric', kwargs={'pk': self.rubric.pk})
+        etag = self.client.get(url)['ETag']
+        # Срок показа истёк, а запись объявления не менялась
+        Ad.objects.filter(pk=self.ad.pk).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, reverse('main:detail', kwargs={'rubric_pk': self.rubric.pk, 'pk': self.ad.pk}))
+
+    def test_comment_changes_detail(self):
+        url = reverse('main:detail', kwargs={'rubric_pk': self.rubric.pk, 'pk': self.ad.pk})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(ad=self.ad, author='Гость', text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_hidden_ad_and_comments_not_found(self):
+        Comment.objects.create(ad=self.ad, author='Гость', text='Комментарий')
+        Ad.objects.filter(pk=self.ad.pk).update(is_active=False)
+        url = reverse('main:detail', kwargs={'rubric_pk': self.rubric.pk, 'pk': self.ad.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('main:comments', kwargs={'pk': self.ad.pk})).status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SessionStoreTestCase(TestCase):
+    """Хранение сессий в кэше с копией в базе данных"""
+
+    def test_database_session_read(self):
+        old_session = DatabaseSessionStore()
+        old_session['cart'] = [1, 2]
+        old_session.save()
+        self.assertEqual(SessionStore(old_session.session_key)['cart'], [1, 2])
+
+    def test_session_survives_cache_loss(self):
+        session = SessionStore()
+        session['cart'] = [1]
+        session.save()
+        caches['default'].clear()
+        self.assertEqual(SessionStore(session.session_key)['cart'], [1])
+
+    def test_unchanged_session_not_saved(self):
+        session = SessionStore()
+        session['cart'] = [1]
+        session.save()
+        session = SessionStore(session.session_key)
+        session['cart'] = [1]
+        with mock.patch.object(session._cache, 'set') as cache_set, self.assertNumQueries(0):
+            session.save()
+        cache_set.assert_not_called()
+
+
+@override_settings(PROFILING_SLOW_THRESHOLD=0, PROFILING_SAMPLE_RATE=0)
+class ProfilingTestCase(TestCase):
+    """Заголовок Server-Timing и журнал медленных запросов"""
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('main:index'))
+        names = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(names, ['db', 'template', 'thumbnail', 'context-processor', 'view', 'total'])
+        slow_request = SlowRequest.objects.get()
+        self.assertEqual(slow_request.view_name, 'main:index')
+        self.assertGreater(slow_request.queries, 0)
+
+
+class MetricsTestCase(TestCase):
+    """Метрики в формате Prometheus"""
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_exposition(self):
+        self.client.get(reverse('main:index'))
+        response = self.client.get(reverse('main:metrics'))
+        self.assertEqual(response.status_code, 200)
+        samples = [sample for family in text_string_to_metric_families(response.content.decode())
+                   for sample in family.samples]
+
+        def value(name, **labels):
+            # Реестр общий для всех тестов, поэтому значения сравниваются снизу
+            return sum(sample.value for sample in samples
+                       if sample.name == name and all(sample.labels.get(k) == v for k, v in labels.items()))
+
+        self.assertGreaterEqual(value('bb_responses_total', view='main:index', status='200'), 1)
+        self.assertGreaterEqual(value('bb_request_duration_seconds_count', view='main:index'), 1)
+        self.assertGreaterEqual(value('bb_request_duration_seconds_bucket', view='main:index', le='+Inf'), 1)
+        self.assertGreaterEqual(value('bb_cache_lookups_total', cache='rubric_tree'), 1)
+
+    def test_metrics_forbidden(self):
+        self.assertEqual(self.client.get(reverse('main:metrics')).status_code, 403)
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    """Постраничный вывод админки с оценкой числа записей"""
+
+    def setUp(self):
+        for i in range(3):
+            AdvancedUser.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+
+    def test_small_result_counted_exactly(self):
+        paginator = EstimatedCountPaginator(AdvancedUser.objects.all(), 2)
+        self.assertEqual(paginator.count, 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Оценка доступна только на PostgreSQL')
+    @override_settings(ADMIN_EXACT_COUNT_THRESHOLD=-1)
+    def test_estimate_used_above_threshold(self):
+        paginator = EstimatedCountPaginator(AdvancedUser.objects.filter(is_activated=True), 2)
+        with query_budget(1):
+            self.assertIsInstance(paginator.count, int)
+
+
+class ImportAdsTestCase(TestCase):
+    """Загрузка объявлений из файла"""
+
+    def setUp(self):
+        AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        self.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        ad = '{"rubric": "Велосипеды", "author": "author", "title": "Велосипед %s", ' \
+             '"description": "Описание", "contacts": "Контакты"}\n'
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(ad % 1 + '{"rubric": \n' + '[1]\n' + ad % 2)
+        self.addCleanup(os.remove, self.path)
+
+    def test_bad_lines_skipped(self):
+        stderr = StringIO()
+        call_command('import_ads', self.path, stderr=stderr)
+        self.assertEqual(sorted(Ad.objects.values_list('title', flat=True)), ['Велосипед 1', 'Велосипед 2'])
+        self.assertIn('Строка 2 пропущена', stderr.getvalue())
+        self.assertIn('Строка 3 пропущена', stderr.getvalue())
+        self.assertEqual(SubRubric.objects.get(pk=self.rubric.pk).ad_count, 2)
+
+    def test_bad_line_strict(self):
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            call_command('import_ads', self.path, '--strict', stderr=StringIO())
+
+
+class ArchiveTestCase(TestCase):
+    """Перенос объявлений в архив"""
+
+    def setUp(self):
+        author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        self.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        self.ad = Ad.objects.create(rubric=self.rubric, author=author, title='Велосипед',
+                                    description='Описание', contacts='Контакты')
+        Comment.objects.create(ad=self.ad, author='Гость', text='Комментарий')
+
+    def test_archive_ads(self):
+        self.assertEqual(archive_ads([self.ad.pk]), 1)
+        self.assertFalse(Ad.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(ArchivedAd.objects.get().comment_count, 1)
+        self.assertEqual(ArchivedComment.objects.get().ad_id, self.ad.pk)
+        self.rubric.refresh_from_db()
+        self.assertEqual(self.rubric.ad_count, 0)
+
+    def test_archived_ad_reachable(self):
+        archive_ads([self.ad.pk])
+        response = self.client.get(reverse('main:detail', kwargs={'rubric_pk': self.rubric.pk, 'pk': self.ad.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'main/archived_detail.html')
+        self.assertContains(response, 'Комментарий')
+
+
+class ExpiryTestCase(TestCase):
+    """Срок показа объявлений"""
+
+    def setUp(self):
+        self.author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        self.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric, ad_lifetime_days=30)
+
+    def create_ad(self, **kwargs):
+        return Ad.objects.create(rubric=self.rubric, author=self.author, title='Велосипед',
+                                 description='Описание', contacts='Контакты', **kwargs)
+
+    def test_default_expiry_from_rubric(self):
+        ad = self.create_ad()
+        self.assertAlmostEqual(ad.expires_at, timezone.now() + datetime.timedelta(days=30),
+                               delta=datetime.timedelta(minutes=1))
+
+    def test_expired_ads_hidden_and_deactivated(self):
+        fresh = self.create_ad()
+        expired = self.create_ad(expires_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(list(Ad.objects.visible()), [fresh])
+        call_command('expire_ads', batch_size=1, stdout=mock.MagicMock(), stderr=mock.MagicMock())
+        expired.refresh_from_db()
+        self.assertFalse(expired.is_active)
+        self.rubric.refresh_from_db()
+        self.assertEqual(self.rubric.ad_count, 1)
+        self.assertEqual(OutgoingMail.objects.get().recipient, 'author@example.com')
+
+
+class CommentModerationTestCase(TestCase):
+    """Массовая модерация комментариев"""
+
+    def setUp(self):
+        author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        self.ads = [Ad.objects.create(rubric=rubric, author=author, title=f'Велосипед {i}',
+                                      description='Описание', contacts='Контакты') for i in range(2)]
+        for ad in self.ads:
+            Comment.objects.create(ad=ad, author='Спамер', text='Реклама')
+            Comment.objects.create(ad=ad, author='Гость', text='Вопрос')
+
+    def test_hide_and_approve_by_author(self):
+        with query_budget(8):
+            self.assertEqual(Comment.objects.filter(author='Спамер').set_active(False), 2)
+        self.assertEqual([ad.comment_count for ad in Ad.objects.order_by('pk')], [1, 1])
+        self.assertEqual(Comment.objects.filter(author='Спамер').set_active(True), 2)
+        self.assertEqual([ad.comment_count for ad in Ad.objects.order_by('pk')], [2, 2])
+
+    def test_hide_author_comments_skips_guests(self):
+        model_admin = mock.MagicMock()
+        hide_author_comments(model_admin, RequestFactory().post('/'), Comment.objects.filter(ad=self.ads[0]))
+        self.assertEqual(Comment.objects.filter(author='Спамер', is_active=True).count(), 0)
+        self.assertEqual(Comment.objects.filter(author=GUEST_AUTHOR, is_active=True).count(), 2)
+        self.assertEqual(model_admin.message_user.call_args_list[0][0][2], messages.WARNING)
+
+    def test_delete_action(self):
+        request = RequestFactory().post('/')
+        request.user = AdvancedUser.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.assertNotIn('delete_selected', CommentAdmin(Comment, admin.site).get_actions(request))
+        delete_comments(mock.MagicMock(), request, Comment.objects.filter(author='Спамер'))
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(LogEntry.objects.count(), 1)
+
+    def test_bulk_delete(self):
+        self.assertEqual(Comment.objects.filter(text__contains='Реклама').bulk_delete(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(recount_ad_comment_counts(), 0)
+
+
+class QueryBudgetTestCase(TestCase):
+    """Бюджеты SQL-запросов страниц"""
+
+    def test_index_within_budget(self):
+        with query_budget(get_query_budget('main:index'), allow_duplicates=False):
+            self.client.get(reverse('main:index'))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Планы запросов проверяются на PostgreSQL')
+class IndexUsageTestCase(TestCase):
+    """Использование индексов в основных запросах к объявлениям и комментариям"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = AdvancedUser.objects.create_user('author', 'author@example.com', 'password')
+        super_rubric = SuperRubric.objects.create(name='Транспорт')
+        cls.rubric = SubRubric.objects.create(name='Велосипеды', super_rubric=super_rubric)
+        for i in range(20):
+            ad = Ad.objects.create(rubric=cls.rubric, author=author, title=f'Велосипед {i}',
+                                   description='Описание', contacts='Контакты', is_active=i % 2 == 0)
+            Comment.objects.create(ad=ad, author='Гость', text='Комментарий')
+        cls.ad = ad
+
+    def explain(self, queryset):
+        with connection.cursor() as cursor:
+            # На маленькой таблице планировщик иначе всегда выбирает последовательное чтение
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_rubric_listing_uses_partial_index(self):
+        ads = Ad.objects.visible().filter(rubric=self.rubric.pk).order_by('-created_at', '-pk')[:3]
+        self.assertIn('main_ad_rubric_active_idx', self.explain(ads))
+
+    def test_latest_ads_use_partial_index(self):
+        ads = Ad.objects.visible().order_by('-created_at', '-pk')[:10]
+        self.assertIn('main_ad_active_created_idx', self.explain(ads))
+
+    def test_next_expiry_uses_partial_index(self):
+        ads = Ad.objects.visible().filter(expires_at__isnull=False).order_by('expires_at').values('expires_at')[:1]
+        self.assertIn('main_ad_active_expires_idx', self.explain(ads))
+
+    def test_ad_comments_use_partial_index(self):
+        comments = Comment.objects.filter(ad=self.ad.pk, is_active=True).order_by('created_at', 'pk')
+        self.assertIn('main_comment_ad_active_idx', self.explain(comments))
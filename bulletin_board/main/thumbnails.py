@@ -0,0 +1,96 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import transaction
+
+from .caching import bump_fragment_versions
+from .profiling import timed_function
+from .storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _init_worker():
+    """Подготовка Django в новом процессе пула"""
+    django.setup()
+
+
+def create_executor(max_workers=None):
+    """Пул процессов для создания миниатюр"""
+    # Процессы запускаются с нуля, чтобы не наследовать соединения с базой данных
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers or settings.THUMBNAIL_WORKERS, mp_context=context,
+                               initializer=_init_worker)
+
+
+def get_executor():
+    """Общий для процесса пул создания миниатюр"""
+    global _executor
+    if _executor is None:
+        _executor = create_executor()
+    return _executor
+
+
+def generate_thumbnails(name):
+    """Создание недостающих миниатюр всех псевдонимов THUMBNAIL_ALIASES для изображения"""
+    from easy_thumbnails.alias import aliases
+    from easy_thumbnails.files import get_thumbnailer
+
+    thumbnailer = get_thumbnailer(content_storage, name)
+    created = 0
+    for options in aliases.all(include_global=True).values():
+        if not thumbnailer.get_existing_thumbnail(options):
+            thumbnailer.get_thumbnail(options)
+            created += 1
+    if created:
+        bump_image_fragment_versions(name)
+    return created
+
+
+def bump_image_fragment_versions(name):
+    """Сброс кэшированных фрагментов, в которые вместо миниатюры попал адрес исходного изображения"""
+    from .models import Ad, AdditionalImage
+
+    ads = list(Ad.objects.filter(image=name).values_list('pk', 'rubric_id'))
+    ad_ids = {pk for pk, rubric_id in ads}
+    ad_ids.update(AdditionalImage.objects.filter(image=name).values_list('ad_id', flat=True))
+    bump_fragment_versions('ad', ad_ids)
+    bump_fragment_versions('rubric', {rubric_id for pk, rubric_id in ads})
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error:
+        logger.error('Не удалось создать миниатюры: %r', error)
+
+
+def schedule_thumbnails(name):
+    """Создание миниатюр в пуле процессов после фиксации транзакции"""
+    if not name or not settings.THUMBNAIL_PREGENERATE:
+        return
+
+    def submit():
+        get_executor().submit(generate_thumbnails, name).add_done_callback(_log_failure)
+
+    transaction.on_commit(submit)
+
+
+@timed_function('thumbnail')
+def get_thumbnail_url(image, alias):
+    """Адрес готовой миниатюры или исходного изображения, если миниатюра ещё не создана"""
+    from easy_thumbnails.alias import aliases
+    from easy_thumbnails.files import get_thumbnailer
+    from easy_thumbnails.options import ThumbnailOptions
+
+    if not image:
+        return ''
+    thumbnailer = get_thumbnailer(image)
+    name = thumbnailer.get_thumbnail_name(ThumbnailOptions(aliases.get(alias)))
+    if thumbnailer.thumbnail_storage.exists(name):
+        return thumbnailer.thumbnail_storage.url(name)
+    return image.url
@@ -1,7 +1,7 @@
 from django.urls import path
 from django.contrib.auth.views import PasswordChangeDoneView, PasswordResetDoneView, PasswordResetCompleteView
 
-from . import views
+from . import views, api
 
 app_name = 'main'
 urlpatterns = [
@@ -28,6 +28,15 @@ urlpatterns = [
     path('accounts/register/', views.RegisterUserView.as_view(), name='register'),
     path('accounts/register/done/', views.RegisterDoneView.as_view(), name='register_done'),
     path('accounts/register/activate/<str:sign>/', views.user_activate, name='register_activate'),
+    path('search/', views.search, name='search'),
+    path('comments/<int:pk>/', views.comments, name='comments'),
+    path('archive/comments/<int:pk>/', views.archived_comments, name='archived_comments'),
+    path('api/rubrics/', api.rubrics, name='api_rubrics'),
+    path('api/rubrics/<int:pk>/ads/', api.rubric_ads, name='api_rubric_ads'),
+    path('api/ads/<int:pk>/', api.ad_detail, name='api_ad_detail'),
+    path('api/ads/<int:pk>/comments/', api.ad_comments, name='api_ad_comments'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('stats/fragment-cache/', views.fragment_cache_stats, name='fragment_cache_stats'),
     path('', views.index, name='index'),
     path('<int:rubric_pk>/<int:pk>/', views.detail, name='detail'),
     path('<int:pk>/', views.by_rubric, name='by_rubric'),
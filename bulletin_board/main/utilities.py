@@ -1,39 +1,164 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from os.path import splitext
 
-from django.template.loader import render_to_string
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string, get_template
 from django.core.signing import Signer
+from django.utils import timezone
 
 from bulletin_board.settings import ALLOWED_HOSTS
+from .metrics import NOTIFICATIONS, MAIL_DELIVERIES
+from .storage import content_storage
 
 signer = Signer()
 
 
+def queue_mail(recipient, subject, body):
+    """Постановка письма в очередь отправки"""
+    OutgoingMail = apps.get_model('main', 'OutgoingMail')
+    return OutgoingMail.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def send_queued_mail(batch_size=None, connection=None):
+    """Отправка очередной партии писем из очереди через одно соединение с почтовым сервером"""
+    OutgoingMail = apps.get_model('main', 'OutgoingMail')
+    batch_size = batch_size or settings.MAIL_QUEUE_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = OutgoingMail.objects.select_for_update(skip_locked=True)
+        queryset = queryset.filter(status=OutgoingMail.PENDING, next_attempt_at__lte=now)
+        batch = list(queryset.order_by('next_attempt_at')[:batch_size])
+        # Письма закрепляются за обработчиком на время отправки
+        lease_until = now + timedelta(seconds=settings.MAIL_QUEUE_LEASE)
+        OutgoingMail.objects.filter(pk__in=[mail.pk for mail in batch]).update(next_attempt_at=lease_until)
+    if not batch:
+        return 0, 0
+    connection = connection or get_connection()
+    sent = failed = 0
+    for mail in batch:
+        mail.attempts += 1
+        message = EmailMessage(mail.subject, mail.body, to=[mail.recipient], connection=connection)
+        try:
+            # Соединение открывается один раз и переиспользуется для всей партии
+            connection.open()
+            connection.send_messages([message])
+        except Exception as error:
+            failed += 1
+            mail.last_error = repr(error)
+            if mail.attempts >= settings.MAIL_QUEUE_MAX_ATTEMPTS:
+                mail.status = OutgoingMail.DEAD
+                MAIL_DELIVERIES.labels('dead').inc()
+            else:
+                MAIL_DELIVERIES.labels('failed').inc()
+                delay = settings.MAIL_QUEUE_RETRY_DELAY * 2 ** (mail.attempts - 1)
+                mail.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            # После ошибки соединение может быть разорвано и будет открыто заново
+            connection.close()
+        else:
+            sent += 1
+            MAIL_DELIVERIES.labels('sent').inc()
+            mail.status = OutgoingMail.SENT
+            mail.sent_at = timezone.now()
+            mail.last_error = ''
+    connection.close()
+    fields = ('status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at')
+    OutgoingMail.objects.bulk_update(batch, fields)
+    return sent, failed
+
+
+def get_host():
+    """Адрес сайта для ссылок в письмах"""
+    if ALLOWED_HOSTS:
+        return 'http://' + ALLOWED_HOSTS[0]
+    return 'http://127.0.0.1:8000'
+
+
 def send_activation_notification(user):
     """Отправка уведомлений на почту"""
-    if ALLOWED_HOSTS:
-        host = 'http://' + ALLOWED_HOSTS[0]
-    else:
-        host = 'http://127.0.0.1:8000'
-    context = {'user': user, 'host': host, 'sign': signer.sign(user.username)}
-    subject = render_to_string('email/activation_letter_subject.txt', context)
-    body_text = render_to_string('email/activation_letter_body.txt', context)
-    user.email_user(subject, body_text)
+    with NOTIFICATIONS.labels('activation', 'failed').count_exceptions():
+        context = {'user': user, 'host': get_host(), 'sign': signer.sign(user.username)}
+        subject = render_to_string('email/activation_letter_subject.txt', context)
+        body_text = render_to_string('email/activation_letter_body.txt', context)
+        queue_mail(user.email, subject, body_text)
+    NOTIFICATIONS.labels('activation', 'queued').inc()
 
 
-def get_timestamp_path(filename):
-    """Генератор имен для дополнительных изображений к объявлению"""
+def send_bulk_activation_notifications(users, batch_size=None, progress=None):
+    """Рассылка писем с предписанием активации партиями через одно соединение с почтовым сервером"""
+    batch_size = batch_size or settings.ACTIVATION_MAIL_BATCH_SIZE
+    subject_template = get_template('email/activation_letter_subject.txt')
+    body_template = get_template('email/activation_letter_body.txt')
+    host = get_host()
+    sent = 0
+    messages = []
+    with get_connection() as connection:
+        for user in users.filter(is_activated=False).iterator(chunk_size=batch_size):
+            context = {'user': user, 'host': host, 'sign': signer.sign(user.username)}
+            subject = subject_template.render(context)
+            body_text = body_template.render(context)
+            messages.append(EmailMessage(subject, body_text, to=[user.email], connection=connection))
+            if len(messages) >= batch_size:
+                sent += connection.send_messages(messages) or 0
+                messages = []
+                if progress:
+                    progress(sent)
+        if messages:
+            sent += connection.send_messages(messages) or 0
+            if progress:
+                progress(sent)
+    return sent
+
+
+def send_expiry_notifications(expired, purged=False):
+    """Постановка в очередь писем авторам об истёкших объявлениях пакетными вставками"""
+    OutgoingMail = apps.get_model('main', 'OutgoingMail')
+    AdvancedUser = apps.get_model('main', 'AdvancedUser')
+    subject_template = get_template('email/ad_expired_letter_subject.txt')
+    body_template = get_template('email/ad_expired_letter_body.txt')
+    host = get_host()
+    author_ids = sorted(expired)
+    queued = 0
+    for start in range(0, len(author_ids), settings.MAIL_QUEUE_BATCH_SIZE):
+        authors = AdvancedUser.objects.filter(pk__in=author_ids[start:start + settings.MAIL_QUEUE_BATCH_SIZE])
+        mails = []
+        for author in authors.only('pk', 'username', 'email'):
+            context = {'author': author, 'titles': expired[author.pk], 'purged': purged, 'host': host}
+            mails.append(OutgoingMail(recipient=author.email, subject=subject_template.render(context).strip(),
+                                      body=body_template.render(context)))
+        OutgoingMail.objects.bulk_create(mails)
+        queued += len(mails)
+    NOTIFICATIONS.labels('ad_expired', 'queued').inc(queued)
+    return queued
+
+
+def purge_media_files(names):
+    """Удаление файлов изображений и их миниатюр из хранилища партиями"""
+    from easy_thumbnails.models import Source, Thumbnail
+    from easy_thumbnails.storage import thumbnail_default_storage
+
+    names = sorted(set(filter(None, names)))
+    for start in range(0, len(names), settings.BULK_DELETE_CHUNK_SIZE):
+        # Файлы, используемые другими объявлениями, остаются в хранилище вместе с миниатюрами
+        chunk = content_storage.delete_unreferenced(names[start:start + settings.BULK_DELETE_CHUNK_SIZE])
+        for thumbnail_name in Thumbnail.objects.filter(source__name__in=chunk).values_list('name', flat=True):
+            thumbnail_default_storage.delete(thumbnail_name)
+        Source.objects.filter(name__in=chunk).delete()
+
+
+def get_timestamp_path(instance, filename):
+    """Генератор имен для изображений к объявлению, окончательный путь по содержимому назначает хранилище"""
     return '%s%s' % (datetime.now().timestamp(), splitext(filename)[1])
 
 
 def send_new_comment_notification(comment):
     """Отправка уведомления о новом комментарии на почту"""
-    if ALLOWED_HOSTS:
-        host = 'http://' + ALLOWED_HOSTS[0]
-    else:
-        host = 'http://127.0.0.1:8000'
-    author = comment.ad.author
-    context = {'author': author, 'host': host, 'comment': comment}
-    subject = render_to_string('email/new_comment_letter_subject.txt', context)
-    body_text = render_to_string('email/new_comment_letter_body.txt', context)
-    author.email_user(subject, body_text)
+    with NOTIFICATIONS.labels('new_comment', 'failed').count_exceptions():
+        author = comment.ad.author
+        context = {'author': author, 'host': get_host(), 'comment': comment}
+        subject = render_to_string('email/new_comment_letter_subject.txt', context)
+        body_text = render_to_string('email/new_comment_letter_body.txt', context)
+        queue_mail(author.email, subject, body_text)
+    NOTIFICATIONS.labels('new_comment', 'queued').inc()
@@ -1,3 +1,7 @@
+import hashlib
+import json
+from functools import wraps
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth import logout
@@ -5,17 +9,27 @@ from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView,
     PasswordResetConfirmView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Min
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.utils import formats, timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
 from django.views.generic.edit import UpdateView, CreateView, DeleteView
 from django.views.generic.base import TemplateView
 from django.contrib.messages.views import SuccessMessageMixin
 from django.urls import reverse_lazy
 from django.core.signing import BadSignature
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.conf import settings
 
-from .models import AdvancedUser, Ad, SubRubric, Comment
+from .models import AdvancedUser, Ad, SubRubric, Comment, ArchivedAd, ArchivedComment, GUEST_AUTHOR, \
+    get_rubric_tree
 from .forms import ChangeUserInfoForm, RegisterUserForm, SearchAdsForm, AdForm, AIFormSet, CommentForm
 from .utilities import signer
+from .paginators import CursorPaginator
+from .caching import get_fragment_cache_stats
+from .metrics import render_metrics
 
 
 class ChangeUserInfoView(SuccessMessageMixin, LoginRequiredMixin, UpdateView):
@@ -118,9 +132,74 @@ class RegisterDoneView(TemplateView):
     template_name = 'accounts/register_done.html'
 
 
+def conditional_page(etag_func, last_modified_func=None, private=False):
+    """Ответ 304 на повторные GET-запросы и заголовки Cache-Control и Vary"""
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+                # Страницы с формой содержат CSRF-токен и не должны попадать в общие кэши
+                if private or request.user.is_authenticated:
+                    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+                else:
+                    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+                patch_vary_headers(response, ('Cookie', ))
+            return response
+        return wrapper
+    return decorator
+
+
+def page_etag(request, updated_at, next_expiry=None):
+    """ETag страницы по времени изменения объявлений, панели рубрик, пользователю и параметрам запроса"""
+    if updated_at is None or len(messages.get_messages(request)):
+        return None
+    data = [updated_at, next_expiry, request.get_full_path(), request.user.pk, get_rubric_tree()]
+    return hashlib.sha1(json.dumps(data, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+
+def get_next_expiry(request, ads):
+    """Ближайшее окончание срока показа среди показываемых объявлений, запрашиваемое один раз на запрос"""
+    # Истёкшее объявление пропадает из списка без изменения записи, до запуска задания expire_ads
+    if not hasattr(request, '_next_expiry'):
+        ads = ads.visible().filter(expires_at__isnull=False)
+        request._next_expiry = ads.aggregate(next_expiry=Min('expires_at'))['next_expiry']
+    return request._next_expiry
+
+
+def index_etag(request):
+    updated_at = Ad.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+    return page_etag(request, updated_at, get_next_expiry(request, Ad.objects.all()))
+
+
+def by_rubric_etag(request, pk):
+    # Учитываются и скрытые объявления, так как их скрытие меняет страницу
+    ads = Ad.objects.filter(rubric=pk)
+    return page_etag(request, ads.aggregate(updated_at=Max('updated_at'))['updated_at'], get_next_expiry(request, ads))
+
+
+def get_ad_updated_at(request, pk):
+    """Время изменения объявления, запрашиваемое один раз на запрос"""
+    if not hasattr(request, '_ad_updated_at'):
+        ads = Ad.objects.viewable_by(request.user).filter(pk=pk)
+        request._ad_updated_at = ads.values_list('updated_at', flat=True).first()
+    return request._ad_updated_at
+
+
+def detail_etag(request, rubric_pk, pk):
+    return page_etag(request, get_ad_updated_at(request, pk))
+
+
+def detail_last_modified(request, rubric_pk, pk):
+    return get_ad_updated_at(request, pk)
+
+
+@conditional_page(index_etag)
 def index(request):
     """Главная страница"""
-    ads = Ad.objects.filter(is_active=True)[:10]
+    ads = Ad.objects.visible()[:10]
     context = {'ads': ads}
     return render(request, 'main/index.html', context)
 
@@ -133,12 +212,19 @@ def profile(request):
     return render(request, 'main/profile.html', context)
 
 
+def get_comments_page(ad_pk, cursor=None, model=Comment):
+    """Страница показываемых комментариев к объявлению"""
+    comments = model.objects.filter(ad=ad_pk, is_active=True)
+    paginator = CursorPaginator(comments, settings.COMMENTS_PER_PAGE, ordering=('created_at', 'pk'))
+    return paginator.get_page(cursor)
+
+
 @login_required
 def profile_ad_detail(request, pk):
     """Детальное описание объявления пользователя"""
-    ad = get_object_or_404(Ad, pk=pk)
+    ad = get_object_or_404(Ad.objects.select_related('rubric'), pk=pk)
     additional_images = ad.additionalimage_set.all()
-    comments = Comment.objects.filter(ad=pk, is_active=True)
+    comments = get_comments_page(pk)
     context = {
         'ad': ad,
         'ais': additional_images,
@@ -216,40 +302,62 @@ def user_activate(request, sign):
     return render(request, template)
 
 
+@conditional_page(by_rubric_etag)
 def by_rubric(request, pk):
     """Список объявлений"""
-    rubric = get_object_or_404(SubRubric, pk=pk)
-    ads = Ad.objects.filter(is_active=True, rubric=pk)
-    if 'keyword' in request.GET:
+    rubric = get_object_or_404(SubRubric.objects.select_related('super_rubric'), pk=pk)
+    ads = Ad.objects.visible().filter(rubric=pk)
+    ordering = ('-created_at', '-pk')
+    if request.GET.get('keyword'):
         keyword = request.GET['keyword']
-        q = Q(title__icontains=keyword) | Q(description__icontains=keyword)
-        ads = ads.filter(q)
+        ads = ads.search(keyword)
+        ordering = ('-rank', ) + ordering
     else:
         keyword = ''
     form = SearchAdsForm(initial={'keyword':keyword})
-    paginator = Paginator(ads, 2)
-    if 'page' in request.GET:
-        page_num = request.GET['page']
-    else:
-        page_num = 1
-    page = paginator.get_page(page_num)
+    paginator = CursorPaginator(ads, settings.ADS_PER_PAGE, ordering, estimate_total=settings.ADS_ESTIMATE_TOTAL)
+    page = paginator.get_page(request.GET.get('cursor'))
     context = {
         'rubric': rubric, 'page': page,
-        'ads': page.object_list, 'form': form
+        'ads': page.object_list, 'form': form,
+        'search_keyword': keyword,
+        'next_expiry': get_next_expiry(request, Ad.objects.filter(rubric=pk)),
     }
     return render(request, 'main/by_rubric.html', context)
 
 
+def search(request):
+    """Поиск объявлений по всем рубрикам"""
+    keyword = request.GET.get('keyword', '')
+    ordering = ('-created_at', '-pk')
+    if keyword:
+        ads = Ad.objects.visible().search(keyword)
+        ordering = ('-rank', ) + ordering
+    else:
+        ads = Ad.objects.none()
+    form = SearchAdsForm(initial={'keyword': keyword})
+    paginator = CursorPaginator(ads, settings.ADS_PER_PAGE, ordering, estimate_total=settings.ADS_ESTIMATE_TOTAL)
+    page = paginator.get_page(request.GET.get('cursor'))
+    context = {
+        'page': page, 'ads': page.object_list,
+        'form': form, 'search_keyword': keyword
+    }
+    return render(request, 'main/search.html', context)
+
+
+@conditional_page(detail_etag, detail_last_modified, private=True)
 def detail(request, rubric_pk, pk):
     """Детальное описание объявления"""
-    ad = get_object_or_404(Ad, pk=pk)
+    ad = Ad.objects.viewable_by(request.user).select_related('rubric').filter(pk=pk).first()
+    if ad is None:
+        return archived_detail(request, pk)
     additional_images = ad.additionalimage_set.all()
-    comments = Comment.objects.filter(ad=pk, is_active=True)
+    comments = get_comments_page(pk)
     initial = {'ad': ad.pk}
     if request.user.is_authenticated:
         initial['author'] = request.user.username
     else:
-        initial['author'] = 'Гость'
+        initial['author'] = GUEST_AUTHOR
     form_class = CommentForm
     form = form_class(initial=initial)
     if request.POST:
@@ -267,3 +375,58 @@ def detail(request, rubric_pk, pk):
         'form': form,
     }
     return render(request, 'main/detail.html', context)
+
+
+def archived_detail(request, pk):
+    """Детальное описание объявления, перенесённого в архив"""
+    ad = get_object_or_404(ArchivedAd.objects.select_related('rubric'), pk=pk)
+    context = {
+        'ad': ad,
+        'ais': ad.archivedadditionalimage_set.all(),
+        'comments': get_comments_page(pk, model=ArchivedComment),
+        'archived': True,
+    }
+    return render(request, 'main/archived_detail.html', context)
+
+
+def comments(request, pk):
+    """Страница комментариев к объявлению в формате JSON"""
+    # Комментарии доступны тем же пользователям, что и страница объявления
+    get_object_or_404(Ad.objects.viewable_by(request.user).only('pk'), pk=pk)
+    return comments_response(get_comments_page(pk, request.GET.get('cursor')))
+
+
+def archived_comments(request, pk):
+    """Страница комментариев к архивному объявлению в формате JSON"""
+    get_object_or_404(ArchivedAd.objects.only('pk'), pk=pk)
+    return comments_response(get_comments_page(pk, request.GET.get('cursor'), model=ArchivedComment))
+
+
+def comments_response(page):
+    data = {
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author,
+                'text': comment.text,
+                'created_at': formats.date_format(timezone.localtime(comment.created_at), 'DATETIME_FORMAT'),
+            }
+            for comment in page
+        ],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+    return JsonResponse(data)
+
+
+@staff_member_required
+def fragment_cache_stats(request):
+    """Счётчики попаданий и промахов кэша фрагментов"""
+    return JsonResponse(get_fragment_cache_stats())
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')